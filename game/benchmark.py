@@ -0,0 +1,46 @@
+import argparse
+import sys
+from simulation.benchmark import SCALES, compare, load_results, run_macro, run_micro, save_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the pathfinders and whole simulation ticks, optionally against a baseline")
+    parser.add_argument("--micro", action="store_true", help="only the pathfinder micro-benchmarks")
+    parser.add_argument("--macro", action="store_true", help="only the simulation macro-benchmarks")
+    parser.add_argument("--scales", nargs="+", default=None, choices=[scale[0] for scale in SCALES],
+                        help="world sizes to run the macro-benchmarks at (default: all)")
+    parser.add_argument("--queries", type=int, default=60, help="searches per micro-benchmark case")
+    parser.add_argument("--repeats", type=int, default=7, help="timing runs per case, the fastest counts")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the searches and simulations")
+    parser.add_argument("--out", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--baseline", default=None, help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown of a group of benchmarks before it counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    if not args.macro:
+        print("Running pathfinder micro-benchmarks")
+        results.update(run_micro(args.queries, args.repeats, args.seed))
+    if not args.micro:
+        print("Running simulation macro-benchmarks")
+        results.update(run_macro(args.scales, seed=args.seed))
+    save_results(results, args.out, {k: v for k, v in vars(args).items() if k not in ("out", "baseline")})
+    print(f"Wrote {len(results)} results to {args.out}")
+
+    if args.baseline is None:
+        for name, result in results.items():
+            print(f"{name:55} {result['seconds'] * 1e6:12.1f} us")
+        return
+    rows, groups, regressions = compare(results, load_results(args.baseline), args.tolerance)
+    for name, before, after, ratio in rows:
+        print(f"{name:55} {before * 1e6:12.1f} us -> {after * 1e6:12.1f} us  x{ratio:.2f}")
+    print()
+    for group, ratio in groups.items():
+        flag = "  REGRESSION" if group in regressions else ""
+        print(f"{group:55} x{ratio:.2f} (geometric mean){flag}")
+    print(f"{len(regressions)} of {len(groups)} groups more than {args.tolerance:.0%} slower than the baseline")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
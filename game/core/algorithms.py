@@ -1,5 +1,10 @@
 import heapq
-from collections import deque
+import itertools
+from collections import OrderedDict
+import numpy as np
+from core import metrics
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
 
 
 
@@ -13,7 +18,7 @@ def get_neighbors(grid, pos, current_direction=None):
     """Return valid neighbor positions (x, y) for a given position (x, y) in the grid."""
     x, y = pos
     neighbors = []
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
+    directions = DIRECTIONS
     
     if current_direction is not None: # remove opposite direction - 180 turns are impossible
         opposite_dir = (-current_direction[0], -current_direction[1])
@@ -22,7 +27,7 @@ def get_neighbors(grid, pos, current_direction=None):
     for dx, dy in directions:
         nx, ny = x + dx, y + dy 
         if 0 <= nx < grid.shape[0] and 0 <= ny < grid.shape[1]: # check map bounds validity
-            if grid[nx][ny] != 999: # check terrain cost validity
+            if grid[nx, ny] != 999: # check terrain cost validity
                 neighbors.append((nx, ny))
                 
     return neighbors
@@ -31,136 +36,339 @@ def get_neighbors(grid, pos, current_direction=None):
 
 def foods_in_vision(snake_pos, foods, vision_range):
     """Return all food entities within vision range"""
+    if hasattr(foods, "within"): # spatial index - only nearby buckets are visited
+        return foods.within(snake_pos, vision_range)
     return [food for food in foods if manhattan(snake_pos, food.position) <= vision_range]
 
 
 
+class SearchState:
+    """Per-cell search bookkeeping, only valid for cells stamped by the current search"""
+    def __init__(self, size):
+        self.came_from = [-1] * size
+        self.cost_so_far = [0] * size
+        self.stamp = [0] * size
+        self.search_ids = itertools.count(1)
+
+
+class SearchWorkspace:
+    """Reusable pathfinding state for one terrain grid - searches run on flat cell indices.
+
+    A workspace can also cover just a window of a larger map: origin is the map tile of its first cell,
+    and workspaces of equal size can share one SearchState.
+    """
+    def __init__(self, grid, origin=(0, 0), state=None):
+        self.grid = grid
+        self.rows, self.cols = grid.shape
+        self.x0, self.y0 = origin
+        size = self.rows * self.cols
+        cells = np.arange(size)
+        self.cost = grid.ravel().tolist()                     # terrain cost per cell
+        self.row_of = (cells // self.cols + self.x0).tolist() # x of each cell
+        self.col_of = (cells % self.cols + self.y0).tolist()  # y of each cell
+        # preallocated search state
+        self.state = state if state is not None else SearchState(size)
+        self.came_from = self.state.came_from
+        self.cost_so_far = self.state.cost_so_far
+        self.stamp = self.state.stamp
+        self.tables = {} # current direction -> passable neighbor table, built on first use
+
+
+    def neighbors(self, current_direction=None):
+        """Per-cell tuples of passable neighbors, without the reverse of current_direction"""
+        table = self.tables.get(current_direction)
+        if table is None:
+            if not self.tables:
+                # neighbor cell per direction, -1 if out of bounds or impassable
+                cells = np.arange(self.rows * self.cols)
+                padded = np.pad(self.grid, 1, constant_values=999)
+                self.steps = []
+                for dx, dy in DIRECTIONS:
+                    target = padded[1 + dx:1 + dx + self.rows, 1 + dy:1 + dy + self.cols].ravel()
+                    self.steps.append(np.where(target != 999, cells + dx * self.cols + dy, -1).tolist())
+            steps = self.steps
+            if current_direction is not None: # remove opposite direction - 180 turns are impossible
+                opposite_dir = (-current_direction[0], -current_direction[1])
+                steps = [s for d, s in zip(DIRECTIONS, steps) if d != opposite_dir]
+            table = [tuple(n for n in cell if n >= 0) for cell in zip(*steps)]
+            self.tables[current_direction] = table
+        return table
+
+
+    def begin(self):
+        """Start a new search - invalidates all previous search state in O(1)"""
+        return next(self.state.search_ids)
+
+
+    def index(self, pos):
+        return (pos[0] - self.x0) * self.cols + pos[1] - self.y0
+
+
+    def indices(self, positions):
+        """Flat indices of the in-bounds positions"""
+        rows, cols, x0, y0 = self.rows, self.cols, self.x0, self.y0
+        return {(x - x0) * cols + y - y0 for x, y in positions if 0 <= x - x0 < rows and 0 <= y - y0 < cols}
+
+
+    def path_to(self, start, current):
+        """Rebuild the path (excluding start) that the current search found to current"""
+        path = []
+        while current != start:
+            path.append((self.row_of[current], self.col_of[current]))
+            current = self.came_from[current]
+        return path[::-1]
+
+
+    def goal_distances(self, goals, center, radius):
+        """Nearest-goal Manhattan distance for every cell within radius of center.
+
+        Returns (distances, x0, y0, width): the distance for cell (x, y) is
+        distances[(x - x0) * width + (y - y0)]. Built with an exact L1 distance
+        transform over the bounded window, so lookups are O(1) whatever the goal count.
+        """
+        cx, cy = center
+        x0, x1 = max(self.x0, cx - radius), min(self.x0 + self.rows, cx + radius + 1)
+        y0, y1 = max(self.y0, cy - radius), min(self.y0 + self.cols, cy + radius + 1)
+        height, width = x1 - x0, y1 - y0
+        dist = np.full((height, width), FAR, dtype=np.int64)
+        for gx, gy in goals:
+            # L1 is separable - a goal outside the window acts like its clamped position plus the offset
+            wx, wy = min(max(gx, x0), x1 - 1), min(max(gy, y0), y1 - 1)
+            offset = abs(gx - wx) + abs(gy - wy)
+            if offset < dist[wx - x0, wy - y0]:
+                dist[wx - x0, wy - y0] = offset
+        dist = _l1_sweep(_l1_sweep(dist, 1), 0)
+        return dist.ravel().tolist(), x0, y0, width
+
+
+FAR = 1 << 40 # distance of cells with no goal in reach
+REGION_MARGIN = 21 # tiles a region reaches past its chunk - more than the largest vision range in core.genes
+REGION_CACHE = 64  # region workspaces kept per chunked terrain, least recently used ones are dropped
+
+
+class NeighborTable(dict):
+    """Lazy neighbor table of a region: a cell's passable neighbors are worked out when a search first expands it"""
+    def __init__(self, cost, steps):
+        self.cost = cost
+        self.steps = steps # flat index offset per allowed direction
+
+
+    def __missing__(self, cell):
+        cost = self.cost
+        neighbors = self[cell] = tuple(cell + step for step in self.steps if cost[cell + step] != 999)
+        return neighbors
+
+
+class RegionWorkspace(SearchWorkspace):
+    """Workspace of one chunk of a chunked terrain plus REGION_MARGIN tiles around it, enough for any search
+    starting in the chunk. Its outer ring is impassable, so neighbor tables can be filled in cell by cell."""
+    def neighbors(self, current_direction=None):
+        table = self.tables.get(current_direction)
+        if table is None:
+            directions = DIRECTIONS
+            if current_direction is not None: # remove opposite direction - 180 turns are impossible
+                opposite_dir = (-current_direction[0], -current_direction[1])
+                directions = [d for d in DIRECTIONS if d != opposite_dir]
+            table = self.tables[current_direction] = NeighborTable(self.cost, [dx * self.cols + dy for dx, dy in directions])
+        return table
+
+
+class RegionWorkspaces:
+    """Search workspaces of a chunked terrain (see simulation.world.Terrain), built per region as searches need them"""
+    def __init__(self, terrain):
+        self.terrain = terrain
+        self.size = terrain.chunk_size
+        self.side = self.size + 2 * REGION_MARGIN
+        self.state = SearchState(self.side * self.side) # regions are searched one at a time
+        self.regions = OrderedDict() # (chunk x, chunk y) -> RegionWorkspace, least recently used first
+
+
+    def get(self, start):
+        """Workspace of the region a search from start runs in"""
+        key = (start[0] // self.size, start[1] // self.size)
+        workspace = self.regions.get(key)
+        if workspace is None:
+            x0, y0 = key[0] * self.size - REGION_MARGIN, key[1] * self.size - REGION_MARGIN
+            costs = self.terrain.costs(x0, x0 + self.side, y0, y0 + self.side)
+            costs[0, :] = costs[-1, :] = costs[:, 0] = costs[:, -1] = 999
+            workspace = self.regions[key] = RegionWorkspace(costs, (x0, y0), self.state)
+            if len(self.regions) > REGION_CACHE:
+                self.regions.popitem(last=False)
+        else:
+            self.regions.move_to_end(key)
+        return workspace
+
+
+def _finish(name, expanded, frontier, path):
+    """Count a finished search if a profiler is listening (pushes = expanded + still queued), pass its path on"""
+    if metrics.active is not None:
+        metrics.active.count_search(name, expanded, expanded + frontier, path)
+    return path
+
+
+def _l1_sweep(values, axis):
+    """One axis of an L1 distance transform: out[i] = min over j of values[j] + |i - j|"""
+    idx = np.arange(values.shape[axis]).reshape((-1, 1) if axis == 0 else (1, -1))
+    forward = np.minimum.accumulate(values - idx, axis=axis) + idx
+    backward = np.flip(np.minimum.accumulate(np.flip(values + idx, axis), axis=axis), axis) - idx
+    return np.minimum(forward, backward)
+
+
+_workspaces = {} # id(grid) -> (grid, workspace)
+
+
+def get_workspace(grid, start=None):
+    """Return the shared SearchWorkspace of a terrain grid, building it on first use.
+
+    grid is a cost array, or a chunked Terrain - then the workspace is the one of the region around start.
+    """
+    entry = _workspaces.get(id(grid))
+    if entry is None or entry[0] is not grid:
+        if len(_workspaces) >= 4: # old worlds are gone, don't keep their tables alive
+            _workspaces.clear()
+        entry = (grid, SearchWorkspace(grid) if isinstance(grid, np.ndarray) else RegionWorkspaces(grid))
+        _workspaces[id(grid)] = entry
+    workspace = entry[1]
+    if isinstance(workspace, RegionWorkspaces):
+        return workspace.get(start)
+    return workspace
+
+
+
 def greedy(grid, start, goals, vision_range, obstacles=None, current_direction=None):
-    """Greedy Best-First Search"""
-    goals = set(goals)
-    queue = deque([start])
-    came_from = {start: None}
-    visited = set([start])
-
-    while queue:
-        current = queue.popleft() # expand node
+    """Greedy Best-First Search (always expands the tile closest to a goal)"""
+    ws = get_workspace(grid, start)
+    neighbor_table = ws.neighbors(current_direction)
+    row_of, col_of, came_from, stamp = ws.row_of, ws.col_of, ws.came_from, ws.stamp
+    blocked = ws.indices(obstacles) if obstacles else ()
+    nearest, x0, y0, width = ws.goal_distances(goals, start, vision_range)
+    goals = ws.indices(goals)
+    sx, sy = start
+    start = ws.index(start)
+    mark = ws.begin()
+    heap = [(nearest[(sx - x0) * width + sy - y0], 0, start)] # (distance to closest goal, insertion order, tile)
+    pushed = 1
+    stamp[start] = mark
+
+    while heap:
+        _, _, current = heapq.heappop(heap) # expand node
         
-        if current in goals: # goal tile found
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            return path[::-1]
-
-        neighbors = get_neighbors(grid, current, current_direction)
-        if obstacles:
-            neighbors = [n for n in neighbors if n not in obstacles]
-        neighbors = [n for n in neighbors if manhattan(start, n) <= vision_range]
-
-        # sort by distance to closest goal
-        neighbors.sort(key=lambda n: min(manhattan(n, g) for g in goals))
-
-        for neighbor in neighbors:
-            if neighbor not in visited:
-                visited.add(neighbor) # mark tile as visited
+        if current in goals: # goal tile found - every push but the queued ones was expanded
+            return _finish("greedy", pushed - len(heap), len(heap), ws.path_to(start, current))
+
+        for neighbor in neighbor_table[current]:
+            if stamp[neighbor] == mark or neighbor in blocked:
+                continue
+            nx, ny = row_of[neighbor], col_of[neighbor]
+            if abs(nx - sx) + abs(ny - sy) <= vision_range:
+                stamp[neighbor] = mark # mark tile as visited
                 came_from[neighbor] = current
-                queue.append(neighbor) # append in que for later expansion
-    return None
+                heapq.heappush(heap, (nearest[(nx - x0) * width + ny - y0], pushed, neighbor))
+                pushed += 1
+    return _finish("greedy", pushed, 0, None)
 
 
 
 def bfs(grid, start, goals, vision_range, obstacles=None, current_direction=None):
     """Breadth-First Search - BFS (ignores terrain cost)."""
-    goals = set(goals)
-    queue = deque([start]) # FIFO queue
-    came_from = {start: None}
-    visited = set([start])
-
-    while queue:
-        current = queue.popleft() # expand node
+    ws = get_workspace(grid, start)
+    neighbor_table = ws.neighbors(current_direction)
+    row_of, col_of, came_from, stamp = ws.row_of, ws.col_of, ws.came_from, ws.stamp
+    blocked = ws.indices(obstacles) if obstacles else ()
+    goals = ws.indices(goals)
+    sx, sy = start
+    start = ws.index(start)
+    mark = ws.begin()
+    queue = [start] # FIFO queue - iterated while it grows, so nothing is popped and the position counts expansions
+    stamp[start] = mark
+
+    for expanded, current in enumerate(queue, 1): # expand node
         
         if current in goals: # goal found
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            return path[::-1]
-
-        neighbors = get_neighbors(grid, current, current_direction)
-        if obstacles:
-            neighbors = [n for n in neighbors if n not in obstacles]
-        neighbors = [n for n in neighbors if manhattan(start, n) <= vision_range]
-
-        for neighbor in neighbors:
-            if neighbor not in visited:
-                visited.add(neighbor) # mark as visited
+            return _finish("bfs", expanded, len(queue) - expanded, ws.path_to(start, current))
+
+        for neighbor in neighbor_table[current]:
+            if stamp[neighbor] == mark or neighbor in blocked:
+                continue
+            if abs(row_of[neighbor] - sx) + abs(col_of[neighbor] - sy) <= vision_range:
+                stamp[neighbor] = mark # mark as visited
                 came_from[neighbor] = current
                 queue.append(neighbor) # add to que for later expansion
                 
-    return None
+    return _finish("bfs", len(queue), 0, None)
 
 
 def ucs(grid, start, goals, vision_range, obstacles=None, current_direction=None):
     """Uniform-Cost Search - UCS (terrain cost)"""
-    goals = set(goals)
+    ws = get_workspace(grid, start)
+    neighbor_table = ws.neighbors(current_direction)
+    row_of, col_of, came_from, stamp = ws.row_of, ws.col_of, ws.came_from, ws.stamp
+    terrain, cost_so_far = ws.cost, ws.cost_so_far
+    blocked = ws.indices(obstacles) if obstacles else ()
+    goals = ws.indices(goals)
+    sx, sy = start
+    start = ws.index(start)
+    mark = ws.begin()
     heap = [(0, start)]
-    came_from = {start: None}
-    cost_so_far = {start: 0}
+    stamp[start] = mark
+    cost_so_far[start] = 0
+    expanded = 0
 
     while heap:
         cost, current = heapq.heappop(heap) # expand the node with the lowest total cost
+        expanded += 1
         
         if current in goals: # goal found
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            return path[::-1]
-
-        neighbors = get_neighbors(grid, current, current_direction)
-        if obstacles:
-            neighbors = [n for n in neighbors if n not in obstacles]
-        neighbors = [n for n in neighbors if manhattan(start, n) <= vision_range]
-
-        for neighbor in neighbors:
-            new_cost = cost + grid[neighbor[0]][neighbor[1]]
-            if neighbor not in cost_so_far or new_cost < cost_so_far[neighbor]: # found unvisited or cheaper tile
+            return _finish("ucs", expanded, len(heap), ws.path_to(start, current))
+
+        for neighbor in neighbor_table[current]:
+            if neighbor in blocked or abs(row_of[neighbor] - sx) + abs(col_of[neighbor] - sy) > vision_range:
+                continue
+            new_cost = cost + terrain[neighbor]
+            if stamp[neighbor] != mark or new_cost < cost_so_far[neighbor]: # found unvisited or cheaper tile
+                stamp[neighbor] = mark
                 cost_so_far[neighbor] = new_cost
                 heapq.heappush(heap, (new_cost, neighbor))
                 came_from[neighbor] = current
                 
-    return None
+    return _finish("ucs", expanded, 0, None)
 
 
 def a_star(grid, start, goals, vision_range, obstacles=None, current_direction=None):
     """A* search (terrain cost + manhattan as heuristic)."""
-    goals = set(goals)
-    heap = [(min(manhattan(start, g) for g in goals), 0, start)] # backward cost = 0 => find smallest forward cost
-    came_from = {start: None}
-    cost_so_far = {start: 0}
+    ws = get_workspace(grid, start)
+    neighbor_table = ws.neighbors(current_direction)
+    row_of, col_of, came_from, stamp = ws.row_of, ws.col_of, ws.came_from, ws.stamp
+    terrain, cost_so_far = ws.cost, ws.cost_so_far
+    blocked = ws.indices(obstacles) if obstacles else ()
+    nearest, x0, y0, width = ws.goal_distances(goals, start, vision_range)
+    goals = ws.indices(goals)
+    sx, sy = start
+    start = ws.index(start)
+    mark = ws.begin()
+    heap = [(nearest[(sx - x0) * width + sy - y0], 0, start)] # backward cost = 0 => find smallest forward cost
+    stamp[start] = mark
+    cost_so_far[start] = 0
+    expanded = 0
 
     while heap:
         _, cost, current = heapq.heappop(heap) 
+        expanded += 1
         if current in goals:
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            return path[::-1]
-
-        neighbors = get_neighbors(grid, current, current_direction)
-        if obstacles:
-            neighbors = [n for n in neighbors if n not in obstacles]
-        neighbors = [n for n in neighbors if manhattan(start, n) <= vision_range]
-
-        for neighbor in neighbors:
-            new_cost = cost + grid[neighbor[0]][neighbor[1]]
-            if neighbor not in cost_so_far or new_cost < cost_so_far[neighbor]:
+            return _finish("a_star", expanded, len(heap), ws.path_to(start, current))
+
+        for neighbor in neighbor_table[current]:
+            nx, ny = row_of[neighbor], col_of[neighbor]
+            if neighbor in blocked or abs(nx - sx) + abs(ny - sy) > vision_range:
+                continue
+            new_cost = cost + terrain[neighbor]
+            if stamp[neighbor] != mark or new_cost < cost_so_far[neighbor]:
+                stamp[neighbor] = mark
                 cost_so_far[neighbor] = new_cost
-                priority = new_cost + min(manhattan(neighbor, g) for g in goals) # backward + forward cost
+                priority = new_cost + nearest[(nx - x0) * width + ny - y0] # backward + forward cost
                 heapq.heappush(heap, (priority, new_cost, neighbor))
                 came_from[neighbor] = current
                 
-    return None
+    return _finish("a_star", expanded, 0, None)
 
-__all__ = ['a_star', 'bfs', 'greedy', 'foods_in_vision', 'ucs']
\ No newline at end of file
+__all__ = ['SearchWorkspace', 'a_star', 'bfs', 'get_workspace', 'greedy', 'foods_in_vision', 'ucs']
\ No newline at end of file
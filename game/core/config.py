@@ -1,9 +1,17 @@
+import copy
+
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 1000
 TILE_SIZE = 10
 STATS_WIDTH = 300
 
-FPS = 20
+WORLD_WIDTH = 100  # tiles, independent of the window - the map view shows the part that fits (default 100)
+WORLD_HEIGHT = 100 # (default 100)
+CHUNKED_WORLD_TILES = 1 << 20 # larger worlds keep snake occupancy per terrain chunk and sample spawns instead of indexing every free tile
+
+FPS = 60 # frames drawn per second by the viewer, independent of the simulation speed (default 60)
+TICKS_PER_SECOND = 20 # simulation ticks per second in the viewer at 1x speed (default 20)
+FRAME_SIM_BUDGET = 0.8 # share of every frame the viewer may spend simulating, the rest is left for drawing (default 0.8)
 FOOD_NR = 50 # (default 50)
 FOOD_ENERGY = 250 # energy provided by 1 food with energy factor gene encoding 10 or 01 (DEFAULT 250)
 FOOD_RESPAWN_RATE = 100 # ticks (DEFAULT 100)
@@ -13,6 +21,23 @@ SHRINK_ENERGY_INTERVAL = 200 # energy spent before shrinking (default 200)
 SNAKE_COUNT = 25 # (DEFAULT 25)
 SNAKE_GENERATION_INTERVAL = 500 # (DEFAULT 500)
 
+PARALLEL_WORKERS = 0 # worker processes for the snakes' path searches, 0 searches in the main process (default 0)
+
+# Run history: stats.hist and genes.hist are written every generation (see simulation/history.py)
+HISTORY_COMPRESS = True # zlib-compress the history chunks (default True)
+HISTORY_CHUNK_GENERATIONS = 32 # generations buffered per chunk written (default 32)
+EXPORT_TEXT_LOGS = False # also append to snake_log.txt, stats.csv and genes.csv (default False)
+
+CHECKPOINT_EVERY = 0 # save the full simulation state every N generations, 0 = only on demand (default 0)
+CHECKPOINT_FILE = "checkpoint.npz"
+
+TRACE_FILE = "" # record every tick's events to this file for replay.py, "" = no trace (default "")
+TRACE_KEYFRAME_EVERY = 100 # ticks between the full-state keyframes replays seek from (default 100)
+
+PROFILE = False # time every tick phase and count the path searches' work (default False)
+PROFILE_FILE = "profile.jsonl" # one JSON line per PROFILE_EVERY ticks, "" = keep the numbers in memory only
+PROFILE_EVERY = 100 # ticks per exported line (default 100)
+
 # Fitness weights: default 3 3 1
 LENGTH_WEIGHT = 3 
 SCORE_WEIGHT = 3
@@ -66,4 +91,23 @@ SNAKE_COLORS = { # generated with coolors.co palette generator
     "absred": (250, 0, 0),
     "absgreen": (0, 250, 0),
     "absblue": (0, 0, 250),
-}  
\ No newline at end of file
+}
+
+
+class Config:
+    """Per-run copy of the variables above - lets parameter sweeps hand each worker its own settings.
+
+    A Config has the same attributes as this module, so either can be passed wherever a config is expected.
+    """
+    def __init__(self, **overrides):
+        defaults = {name: value for name, value in globals().items() if name.isupper()}
+        unknown = set(overrides) - set(defaults)
+        if unknown:
+            raise KeyError(f"Unknown config variables: {', '.join(sorted(unknown))}")
+        self.__dict__.update(copy.deepcopy(defaults))
+        self.__dict__.update(overrides)
+
+
+    def __repr__(self):
+        return f"Config({self.__dict__!r})"
+
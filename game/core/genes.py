@@ -1,4 +1,5 @@
 import random
+import numpy as np
 import core.algorithms as algos
 
 # ----- Constants ------
@@ -83,6 +84,50 @@ DECODER = {
 }
 
 
+# ----- Decode table ------
+# a phenotype is the combination of decoded values - codes 01 and 10 decode the same for most genes,
+# so the 2^20 chromosomes map to only 78,732 phenotypes
+VALUES = {gene: list(dict.fromkeys(DECODER[gene].values())) for gene in LAYOUT} # distinct values per gene
+VALUE_INDEX = { # gene -> raw code -> index into VALUES[gene]
+    gene: [VALUES[gene].index(DECODER[gene][raw]) for raw in range(1 << length)]
+    for gene, (start, length) in LAYOUT.items()
+}
+CATEGORICAL = [ # functions and strings are stored as their index into VALUES in the table
+    gene for gene in LAYOUT if not all(isinstance(v, (int, float)) for v in VALUES[gene])
+]
+TRAIT_DTYPE = np.dtype([
+    (gene, np.uint8 if gene in CATEGORICAL else np.asarray(VALUES[gene]).dtype) for gene in LAYOUT
+])
+PHENOTYPE_COUNT = int(np.prod([len(VALUES[gene]) for gene in LAYOUT]))
+
+_decode_table = None
+
+
+def decode_table():
+    """(phenotype id of every chromosome, structured traits of every phenotype), built on first use"""
+    global _decode_table
+    if _decode_table is None:
+        chromosomes = np.arange(1 << CHROMOSOME_LENGTH)
+        phenotypes = np.zeros(len(chromosomes), dtype=np.int32)
+        ids = np.arange(PHENOTYPE_COUNT)
+        traits = np.zeros(PHENOTYPE_COUNT, dtype=TRAIT_DTYPE)
+        radix = 1 # phenotype id = mixed radix number of the value indices
+        for gene, (start, length) in LAYOUT.items():
+            count = len(VALUES[gene])
+            phenotypes += np.asarray(VALUE_INDEX[gene])[(chromosomes >> start) & ((1 << length) - 1)] * radix
+            digits = (ids // radix) % count
+            traits[gene] = digits if gene in CATEGORICAL else np.asarray(VALUES[gene])[digits]
+            radix *= count
+        _decode_table = (phenotypes, traits)
+    return _decode_table
+
+
+def traits_of(chromosomes):
+    """Decoded traits of a chromosome (record) or an array of chromosomes (structured array) - one fancy index"""
+    phenotypes, traits = decode_table()
+    return traits[phenotypes[chromosomes]]
+
+
 def extract(chromosome: int, start: int, length: int) -> int:
     """Extract a gene from a chromosome"""
     mask = (1 << length) - 1
@@ -105,21 +150,55 @@ def mutate(chromosome: int, mutation_rate: float, l=CHROMOSOME_LENGTH) -> int:
 def crossover(parent1: int, parent2: int) -> int:
     """Crossover 2 chromosomes bit-by-bit"""
     child = 0
+    p1_dom = DECODER["gene_dominance"][extract(parent1, *LAYOUT["gene_dominance"])]
+    p2_dom = DECODER["gene_dominance"][extract(parent2, *LAYOUT["gene_dominance"])]
+    bias = 0.5 + (p1_dom - p2_dom) # the same for every gene
     for gene, (start, length) in LAYOUT.items():
-        p1_dom = DECODER["gene_dominance"][extract(parent1, *LAYOUT["gene_dominance"])]
-        p2_dom = DECODER["gene_dominance"][extract(parent2, *LAYOUT["gene_dominance"])]
-        bias = 0.5 + (p1_dom - p2_dom)  
-        
         inherited_gene = extract(parent1, start, length) if random.random() < bias else extract(parent2, start, length)
         child |= (inherited_gene << start)
     
     return child
 
 
-def decode_chromosome(chromosome):
-    """Decode bit gene values into traits"""
-    traits = {}
-    for gene, (start, length) in LAYOUT.items():
-        raw_value = extract(chromosome, start, length)
-        traits[gene] = DECODER[gene][raw_value]
-    return traits
\ No newline at end of file
+# ----- Batch evolution ------
+GENE_MASKS = np.array([((1 << length) - 1) << start for start, length in LAYOUT.values()], dtype=np.int64)
+
+
+def pick_parents(count, survivors, rng):
+    """Indices of count parent pairs drawn from survivors, two different parents whenever possible"""
+    parents1 = rng.integers(0, survivors, count)
+    if survivors < 2:
+        return parents1, parents1
+    parents2 = (parents1 + rng.integers(1, survivors, count)) % survivors
+    return parents1, parents2
+
+
+def crossover_batch(parents1, parents2, rng, masks=GENE_MASKS, bias=None):
+    """Vectorized crossover of two chromosome arrays - every masked gene comes from parents1 with probability bias.
+
+    The default bias is the dominance bias of crossover().
+    """
+    if bias is None:
+        bias = 0.5 + traits_of(parents1)["gene_dominance"] - traits_of(parents2)["gene_dominance"]
+    picks = rng.random((len(parents1), len(masks))) < np.reshape(bias, (-1, 1))
+    from_first = np.bitwise_or.reduce(np.where(picks, masks, 0), axis=1)
+    return (parents1 & from_first) | (parents2 & ~from_first)
+
+
+def mutate_batch(chromosomes, mutation_rates, rng, l=CHROMOSOME_LENGTH):
+    """Vectorized mutate(): flip one random bit of each chromosome with its mutation rate"""
+    flips = rng.random(len(chromosomes)) < mutation_rates
+    bits = rng.integers(0, l, len(chromosomes))
+    return chromosomes ^ (flips.astype(np.int64) << bits)
+
+
+def breed(chromosomes, fitness, selected_count, count, rng):
+    """Batch evolution step: count children of the selected_count fittest chromosomes.
+
+    Children get dominance-biased crossover and a mutation chance set by their own mutability gene.
+    """
+    ranking = np.argsort(-np.asarray(fitness), kind="stable") # best first, ties keep their order
+    survivors = np.asarray(chromosomes, dtype=np.int64)[ranking[:selected_count]]
+    parents1, parents2 = pick_parents(count, len(survivors), rng)
+    children = crossover_batch(survivors[parents1], survivors[parents2], rng)
+    return mutate_batch(children, traits_of(children)["mutability"], rng)
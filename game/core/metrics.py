@@ -0,0 +1,160 @@
+import json
+import math
+import time
+
+BUCKETS = 32 # power-of-two microsecond buckets: [0, 1), [1, 2), [2, 4), ... up to ~35 minutes
+
+# profiler the path searches report to - None keeps them from counting anything
+active = None
+
+
+class Histogram:
+    """Timing histogram with power-of-two microsecond buckets"""
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    def add(self, seconds):
+        micros = seconds * 1e6
+        self.buckets[min(math.frexp(micros)[1] if micros >= 1 else 0, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+    def percentile(self, q):
+        """Upper bound (seconds) of the bucket holding the q-th percentile"""
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(2.0 ** i / 1e6, self.max)
+        return self.max
+
+
+    def summary(self):
+        """Plain values for the JSON export, times in milliseconds"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count, "total_ms": self.total * 1e3, "mean_ms": self.total / self.count * 1e3,
+            "p50_ms": self.percentile(50) * 1e3, "p90_ms": self.percentile(90) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3, "max_ms": self.max * 1e3,
+        }
+
+
+class SearchCounters:
+    """Work done by one pathfinding algorithm"""
+    def __init__(self):
+        self.searches = 0
+        self.failed = 0
+        self.expanded = 0
+        self.pushed = 0
+        self.path_tiles = 0
+
+
+    def summary(self):
+        found = self.searches - self.failed
+        return {
+            "searches": self.searches, "failed": self.failed, "expanded": self.expanded, "pushed": self.pushed,
+            "expanded_per_search": self.expanded / self.searches if self.searches else 0.0,
+            "mean_path_length": self.path_tiles / found if found else 0.0,
+        }
+
+
+class Profiler:
+    """Per-phase tick timings and search counters of a run, appended to a JSON lines file every export.
+
+    Timings are taken as laps: start() at the beginning of a tick or frame, then lap(phase) after every phase.
+    Every export writes the numbers since the previous one and starts over.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.last = 0.0
+        self.tick_start = 0.0
+        self.previous = None
+        self.reset()
+
+
+    def reset(self):
+        if getattr(self, "phases", None):
+            self.previous = (self.phases, self.searches) # the last complete interval, for lines()
+        self.phases = {}   # phase name -> Histogram
+        self.searches = {} # algorithm name -> SearchCounters
+        self.interval_start = time.perf_counter()
+
+
+    def start(self):
+        self.tick_start = self.last = time.perf_counter()
+
+
+    def lap(self, phase):
+        """Time since the last start or lap goes to phase"""
+        now = time.perf_counter()
+        self.record(phase, now - self.last)
+        self.last = now
+
+
+    def end_tick(self):
+        """Close the last phase and time the whole tick"""
+        self.record("tick", time.perf_counter() - self.tick_start)
+
+
+    def record(self, phase, seconds):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.add(seconds)
+
+
+    def count_search(self, algorithm, expanded, pushed, path):
+        counters = self.searches.get(algorithm)
+        if counters is None:
+            counters = self.searches[algorithm] = SearchCounters()
+        counters.searches += 1
+        counters.expanded += expanded
+        counters.pushed += pushed
+        if path:
+            counters.path_tiles += len(path)
+        else:
+            counters.failed += 1
+
+
+    def snapshot(self, **context):
+        """Everything measured since the last export, plus context like the tick and generation"""
+        return {
+            **context, "seconds": time.perf_counter() - self.interval_start,
+            "phases": {name: h.summary() for name, h in self.phases.items()},
+            "searches": {name: c.summary() for name, c in self.searches.items()},
+        }
+
+
+    def export(self, **context):
+        """Append a snapshot as one JSON line (if there is a file) and start a new interval"""
+        snapshot = self.snapshot(**context)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        self.reset()
+        return snapshot
+
+
+    def lines(self):
+        """Short text summary for the stats panel and the console - of the last exported interval once there is one"""
+        phases, searches = self.previous or (self.phases, self.searches)
+        lines = ["phase: mean / p90 ms"]
+        for name, histogram in phases.items():
+            if histogram.count:
+                lines.append(f"{name}: {histogram.total / histogram.count * 1e3:.2f} / {histogram.percentile(90) * 1e3:.2f}")
+        for name, counters in searches.items():
+            summary = counters.summary()
+            lines.append(
+                f"{name}: {counters.searches} searches, {summary['expanded_per_search']:.0f} nodes, "
+                f"{counters.failed} failed"
+            )
+        return lines
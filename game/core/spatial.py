@@ -0,0 +1,316 @@
+import numpy as np
+
+BUCKET_SIZE = 8 # tiles per side of a food bucket
+CHUNK_SIZE = 64 # tiles per side of a ChunkGrid chunk
+EMPTY = -1 # occupancy value of a tile with no snake on it
+
+
+class FoodIndex:
+    """Food container with a uniform bucket grid for fast radius queries"""
+    def __init__(self, foods=(), bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.items = {}    # food -> None, dicts keep insertion order so iteration stays deterministic
+        self.rank = {}     # food -> insertion counter, so queries can return foods in insertion order
+        self.next_rank = 0
+        self.cells = {}    # position -> {food: None} of foods on that tile
+        self.buckets = {}  # (bucket_x, bucket_y) -> {food: None}
+        self.toxic_count = 0
+        self.extend(foods)
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+
+    def __contains__(self, food):
+        return food in self.items
+
+
+    def bucket_of(self, pos):
+        return (pos[0] // self.bucket_size, pos[1] // self.bucket_size)
+
+
+    def add(self, food):
+        """Insert a food in O(1)"""
+        self.items[food] = None
+        self.rank[food] = self.next_rank
+        self.next_rank += 1
+        self.toxic_count += food.toxic
+        self.cells.setdefault(food.position, {})[food] = None
+        self.buckets.setdefault(self.bucket_of(food.position), {})[food] = None
+
+
+    def extend(self, foods):
+        for food in foods:
+            self.add(food)
+
+
+    def _unlink(self, food, pos):
+        cell = self.cells[pos]
+        del cell[food]
+        if not cell:
+            del self.cells[pos]
+        key = self.bucket_of(pos)
+        bucket = self.buckets[key]
+        del bucket[food]
+        if not bucket:
+            del self.buckets[key]
+
+
+    def remove(self, food):
+        """Remove a food (e.g. eaten) in O(1)"""
+        self._unlink(food, food.position)
+        del self.items[food]
+        del self.rank[food]
+        self.toxic_count -= food.toxic
+
+
+    def relocate(self, food, old_position):
+        """Update the index after food.position changed from old_position"""
+        self._unlink(food, old_position)
+        self.cells.setdefault(food.position, {})[food] = None
+        self.buckets.setdefault(self.bucket_of(food.position), {})[food] = None
+
+
+    def orders(self):
+        """Order of the foods inside every cell and bucket, as indices into the insertion order (for checkpoints)"""
+        rank = {food: i for i, food in enumerate(self.items)}
+        cells = [rank[food] for cell in self.cells.values() for food in cell]
+        buckets = [rank[food] for bucket in self.buckets.values() for food in bucket]
+        return cells, buckets
+
+
+    @classmethod
+    def restore(cls, foods, cell_order, bucket_order, bucket_size=BUCKET_SIZE):
+        """Rebuild an index with the exact iteration orders saved by orders()"""
+        index = cls(bucket_size=bucket_size)
+        for food in foods:
+            index.items[food] = None
+            index.rank[food] = index.next_rank
+            index.next_rank += 1
+            index.toxic_count += food.toxic
+        for i in cell_order:
+            index.cells.setdefault(foods[i].position, {})[foods[i]] = None
+        for i in bucket_order:
+            index.buckets.setdefault(index.bucket_of(foods[i].position), {})[foods[i]] = None
+        return index
+
+
+    def first_at(self, pos):
+        """Return the oldest food on a tile, or None"""
+        cell = self.cells.get(pos)
+        return next(iter(cell)) if cell else None
+
+
+    def within(self, pos, radius):
+        """Return foods within Manhattan radius of pos in insertion order, visiting only nearby buckets"""
+        x, y = pos
+        b = self.bucket_size
+        found = []
+        for bx in range((x - radius) // b, (x + radius) // b + 1):
+            # closest row of this bucket column to x - skip buckets entirely out of reach
+            dx = max(bx * b - x, 0, x - (bx * b + b - 1))
+            if dx > radius:
+                continue
+            for by in range((y - radius) // b, (y + radius) // b + 1):
+                bucket = self.buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for food in bucket:
+                    fx, fy = food.position
+                    if abs(fx - x) + abs(fy - y) <= radius:
+                        found.append(food)
+        found.sort(key=self.rank.__getitem__) # bucket order differs from insertion order, which breaks ties
+        return found
+
+
+    def in_rect(self, x0, x1, y0, y1):
+        """Return foods in rows x0:x1 and cols y0:y1, visiting only the buckets overlapping them"""
+        b = self.bucket_size
+        found = []
+        for bx in range(x0 // b, (x1 - 1) // b + 1):
+            for by in range(y0 // b, (y1 - 1) // b + 1):
+                bucket = self.buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for food in bucket:
+                    fx, fy = food.position
+                    if x0 <= fx < x1 and y0 <= fy < y1:
+                        found.append(food)
+        return found
+
+
+class TileSet:
+    """Set of tiles of a grid with O(1) add/discard and O(k) random sampling without replacement.
+
+    Tiles are stored as flat indices (x * cols + y) in an array, with a per-tile array of their slot
+    (-1 if absent) - a discard moves the last tile into the gap.
+    """
+    def __init__(self, shape, flat=()):
+        self.shape = shape
+        self.cols = shape[1]
+        self.tiles = np.empty(shape[0] * shape[1], dtype=np.int64)
+        self.index = np.full(shape[0] * shape[1], -1, dtype=np.int64)
+        flat = np.asarray(flat, dtype=np.int64)
+        self.count = len(flat)
+        self.tiles[:self.count] = flat
+        self.index[flat] = np.arange(self.count)
+
+
+    @classmethod
+    def from_mask(cls, mask):
+        """All tiles where a boolean grid is set, in row-major order"""
+        return cls(mask.shape, np.flatnonzero(mask))
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __iter__(self):
+        return iter(self.positions(self.flat()))
+
+
+    def __contains__(self, tile):
+        return self.index[tile[0] * self.cols + tile[1]] >= 0
+
+
+    def flat(self):
+        """Flat indices of the tiles in their current order (a copy)"""
+        return self.tiles[:self.count].copy()
+
+
+    def positions(self, flat):
+        return list(zip(*(a.tolist() for a in np.divmod(flat, self.cols))))
+
+
+    def add(self, tile):
+        t = tile[0] * self.cols + tile[1]
+        if self.index[t] < 0:
+            self.index[t] = self.count
+            self.tiles[self.count] = t
+            self.count += 1
+
+
+    def discard(self, tile):
+        t = tile[0] * self.cols + tile[1]
+        i = self.index[t]
+        if i < 0:
+            return
+        self.count -= 1
+        last = self.tiles[self.count]
+        self.tiles[i] = last # move the last tile into the gap
+        self.index[last] = i
+        self.index[t] = -1
+
+
+    def sample(self, k, rng):
+        """k distinct random tiles (at most len), by a partial Fisher-Yates shuffle of the first k slots"""
+        tiles, index = self.tiles, self.index
+        n = self.count
+        k = min(k, n)
+        picks = (np.arange(k) + rng.random(k) * (n - np.arange(k))).astype(np.int64).tolist()
+        for i, j in enumerate(picks):
+            tiles[i], tiles[j] = tiles[j], tiles[i]
+            index[tiles[i]] = i
+            index[tiles[j]] = j
+        return self.positions(tiles[:k])
+
+
+class ChunkGrid:
+    """Grid stored as CHUNK_SIZE x CHUNK_SIZE numpy blocks that only exist once a tile in them is written.
+
+    Reads of tiles in missing chunks (or outside the grid) give the fill value, so memory stays proportional
+    to the area in use. Subclasses can generate chunks on first read by overriding load.
+    """
+    def __init__(self, shape, dtype, fill, chunk_size=CHUNK_SIZE):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        self.chunk_size = chunk_size
+        self.chunks = {} # (x // chunk_size, y // chunk_size) -> array
+
+
+    def load(self, key):
+        """Chunk to read from, None if it holds nothing but the fill value"""
+        return self.chunks.get(key)
+
+
+    def chunk(self, key):
+        """Chunk to write to, allocated on first use"""
+        chunk = self.load(key)
+        if chunk is None:
+            chunk = self.chunks[key] = np.full((self.chunk_size, self.chunk_size), self.fill, dtype=self.dtype)
+        return chunk
+
+
+    def __getitem__(self, pos):
+        x, y = pos
+        s = self.chunk_size
+        chunk = self.chunks.get((x // s, y // s))
+        if chunk is None:
+            chunk = self.load((x // s, y // s))
+            if chunk is None:
+                return self.fill
+        return chunk[x % s, y % s]
+
+
+    def __setitem__(self, pos, value):
+        x, y = pos
+        s = self.chunk_size
+        self.chunk((x // s, y // s))[x % s, y % s] = value
+
+
+    def window(self, x0, x1, y0, y1):
+        """Copy of the tiles in rows x0:x1 and cols y0:y1 - the window may reach outside the grid (fill value there)"""
+        out = np.full((x1 - x0, y1 - y0), self.fill, dtype=self.dtype)
+        s = self.chunk_size
+        rows, cols = self.shape
+        for cx in range(max(x0, 0) // s, (min(x1, rows) - 1) // s + 1):
+            for cy in range(max(y0, 0) // s, (min(y1, cols) - 1) // s + 1):
+                chunk = self.load((cx, cy))
+                if chunk is None:
+                    continue
+                # overlap of the chunk and the window, in grid coordinates
+                ax, bx = max(x0, cx * s, 0), min(x1, cx * s + s, rows)
+                ay, by = max(y0, cy * s, 0), min(y1, cy * s + s, cols)
+                out[ax - x0:bx - x0, ay - y0:by - y0] = chunk[ax - cx * s:bx - cx * s, ay - cy * s:by - cy * s]
+        return out
+
+
+    def gather(self, xs, ys):
+        """Values at the tiles (xs[i], ys[i]) as an array"""
+        get = ChunkGrid.__getitem__ # stored values, whatever a subclass makes of indexing
+        return np.array([get(self, tile) for tile in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())], dtype=self.dtype)
+
+
+    def items(self):
+        """(tiles as an (n, 2) array, values) of every tile that differs from the fill value"""
+        s = self.chunk_size
+        tiles, values = [np.empty((0, 2), dtype=np.int64)], [np.empty(0, dtype=self.dtype)]
+        for (cx, cy), chunk in self.chunks.items():
+            local = np.argwhere(chunk != self.fill)
+            tiles.append(local + (cx * s, cy * s))
+            values.append(chunk[local[:, 0], local[:, 1]])
+        return np.concatenate(tiles), np.concatenate(values)
+
+
+    def clear(self):
+        """Back to the fill value everywhere"""
+        self.chunks.clear()
+
+
+def grid_window(grid, x0, x1, y0, y1, fill):
+    """Copy of rows x0:x1 and cols y0:y1 of a numpy grid or a ChunkGrid, fill where the window leaves the grid"""
+    if isinstance(grid, ChunkGrid):
+        return grid.window(x0, x1, y0, y1)
+    out = np.full((x1 - x0, y1 - y0), fill, dtype=grid.dtype)
+    rows, cols = grid.shape
+    ax, bx, ay, by = max(x0, 0), min(x1, rows), max(y0, 0), min(y1, cols)
+    if ax < bx and ay < by:
+        out[ax - x0:bx - x0, ay - y0:by - y0] = grid[ax:bx, ay:by]
+    return out
@@ -0,0 +1,76 @@
+from collections import deque
+
+
+class Body:
+    """Snake body segments, head first, with O(1) head push/tail pop and a per-tile segment counter"""
+    def __init__(self, segments=()):
+        self.segments = deque(segments)
+        self.counts = {} # tile -> number of segments on it (a grown tail is duplicated)
+        for pos in self.segments:
+            self.counts[pos] = self.counts.get(pos, 0) + 1
+
+
+    def __len__(self):
+        return len(self.segments)
+
+
+    def __iter__(self):
+        return iter(self.segments)
+
+
+    def __getitem__(self, index):
+        """Segment by index - O(1) near the head or the tail"""
+        return self.segments[index]
+
+
+    def __contains__(self, pos):
+        return pos in self.counts
+
+
+    def _count(self, pos):
+        self.counts[pos] = self.counts.get(pos, 0) + 1
+
+
+    def _uncount(self, pos):
+        left = self.counts[pos] - 1
+        if left:
+            self.counts[pos] = left
+        else:
+            del self.counts[pos]
+
+
+    def push_head(self, pos):
+        self.segments.appendleft(pos)
+        self._count(pos)
+
+
+    def append(self, pos):
+        """Add a segment behind the tail"""
+        self.segments.append(pos)
+        self._count(pos)
+
+
+    def pop_tail(self):
+        pos = self.segments.pop()
+        self._uncount(pos)
+        return pos
+
+
+    def trim_tail(self, count):
+        """Drop count tail segments in O(count), return them head to tail"""
+        removed = [self.pop_tail() for _ in range(count)]
+        removed.reverse()
+        return removed
+
+
+    def interior_contains(self, pos):
+        """Check if a tile is covered by a segment other than the head and the tail (i.e. body[1:-1])"""
+        count = self.counts.get(pos, 0)
+        if not count:
+            return False
+        return count - (pos == self.segments[0]) - (pos == self.segments[-1]) > 0
+
+
+    def cells(self):
+        """Distinct tiles covered by the body"""
+        return self.counts.keys()
@@ -1,6 +1,7 @@
 import random
 import core.config as config
 import core.genes as genes
+from core.spatial import EMPTY
 
 class Food:
     """Food entity class"""
@@ -24,14 +25,13 @@ class Food:
             self.energy_factor = 1.5
     
     
-    def move(self, grid, snakes):
+    def move(self, grid, occupancy):
         """Move randomly by 1 tile on the grid"""
         if not self.moving: # no movement if inactive moving gene
             return
         from core.algorithms import get_neighbors
-        occupied = {pos for snake in snakes for pos in snake.body}
         neighbors = get_neighbors(grid, self.position)
-        valid = [n for n in neighbors if n not in occupied]
+        valid = [n for n in neighbors if occupancy[n] == EMPTY] # skip tiles taken by snakes
         if valid and random.random() <= 0.33: # 33% movement chance
             new_pos = random.choice(valid)
             self.position = new_pos
\ No newline at end of file
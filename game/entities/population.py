@@ -0,0 +1,134 @@
+import numpy as np
+import core.config as default_config
+from core import genes
+
+# per-snake state, one numpy array each
+STATE_COLUMNS = [
+    ("chr", np.int64),
+    ("x", np.int64), ("y", np.int64),   # head position
+    ("dx", np.int64), ("dy", np.int64), # direction
+    ("energy", np.float64),
+    ("energy_since_last_shrink", np.float64),
+    ("score", np.int64),
+    ("length", np.int64),
+    ("alive", np.bool_),
+]
+
+# decoded traits, read from the genes decode table - categorical genes (functions, strings)
+# hold their index into genes.VALUES
+TRAIT_COLUMNS = [
+    ("algorithm", np.uint8),
+    ("vision_range", np.int64),
+    ("mutability", np.float64),
+    ("exploration", np.float64),
+    ("max_energy", np.int64),
+    ("timidity", np.int64),
+    ("toxic_reaction", np.uint8),
+    ("toxic_resistance", np.float64),
+    ("food_preference", np.uint8),
+]
+
+COLUMNS = STATE_COLUMNS + TRAIT_COLUMNS
+
+
+class Population:
+    """Struct-of-arrays store for one generation of snakes - every Snake is a view of one row"""
+    def __init__(self, config=None, capacity=32):
+        self.config = config if config is not None else default_config
+        self.size = 0
+        self.snakes = [] # Snake views, snakes[slot] reads row slot
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.zeros(max(capacity, 1), dtype=dtype))
+
+
+    def __len__(self):
+        return self.size
+
+
+    def reserve(self, count):
+        """Append count fresh rows (state zeroed, alive) and return their slots - the caller adds the views"""
+        needed = self.size + count
+        if needed > len(self.chr): # full - at least double the capacity
+            extra = max(needed, 2 * len(self.chr)) - len(self.chr)
+            for name, dtype in COLUMNS:
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra, dtype=dtype)]))
+        slots = np.arange(self.size, needed)
+        for name, _ in STATE_COLUMNS:
+            getattr(self, name)[slots] = 0
+        self.alive[slots] = True
+        self.size = needed
+        return slots
+
+
+    def add(self, snake):
+        """Append a row for a new snake and return its slot"""
+        slot = int(self.reserve(1)[0])
+        self.snakes.append(snake)
+        return slot
+
+
+    def decode(self, slots=None):
+        """Fill the trait columns of one row, an array of rows or (None) every row with one table lookup"""
+        if slots is None:
+            slots = slice(0, self.size)
+        traits = genes.traits_of(self.chr[slots])
+        for name, _ in TRAIT_COLUMNS:
+            getattr(self, name)[slots] = traits[name]
+
+
+    def fitness(self):
+        """Fitness of every snake, in slot order"""
+        n = self.size
+        return (self.config.LENGTH_WEIGHT * self.length[:n] +
+                self.config.SCORE_WEIGHT * self.score[:n] +
+                self.config.ENERGY_WEIGHT * (self.energy[:n] // 100))
+
+
+    def spend_energy(self, world, slots):
+        """Terrain energy drain, shrinking and deaths for the snakes that moved this tick, in one pass.
+
+        Returns the slots that are still alive.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        cost = np.maximum(1, world.grid[self.x[slots], self.y[slots]])
+        self.energy[slots] -= cost
+        self.energy_since_last_shrink[slots] += cost
+
+        interval = self.config.SHRINK_ENERGY_INTERVAL
+        shrinking = slots[(self.energy_since_last_shrink[slots] >= interval) & (self.length[slots] > 3)]
+        counts = np.minimum(self.energy_since_last_shrink[shrinking] // interval, self.length[shrinking] - 1)
+        self.energy_since_last_shrink[shrinking] %= interval
+        for slot, count in zip(shrinking.tolist(), counts.astype(np.int64).tolist()):
+            self.snakes[slot].shrink(count, world)
+
+        dead = (self.energy[slots] <= 0) | (self.length[slots] < 3) # no energy or length < 3 => death
+        self.alive[slots[dead]] = False
+        return slots[~dead]
+
+
+    def cull(self):
+        """Drop dead snakes, compacting the columns - dead views keep a private copy of their row"""
+        n = self.size
+        keep = np.flatnonzero(self.alive[:n])
+        if len(keep) == n:
+            return
+        for slot in np.flatnonzero(~self.alive[:n]).tolist():
+            self.detach(self.snakes[slot])
+        for name, _ in COLUMNS:
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.snakes = [self.snakes[i] for i in keep.tolist()]
+        for slot, snake in enumerate(self.snakes):
+            snake.slot = slot
+        self.size = len(keep)
+
+
+    def detach(self, snake):
+        """Move a snake's row into its own one-row store, e.g. so a selected dead snake stays readable"""
+        own = Population(self.config, capacity=1)
+        own.size = 1
+        own.snakes = [snake]
+        for name, _ in COLUMNS:
+            getattr(own, name)[0] = getattr(self, name)[snake.slot]
+        snake.population = own
+        snake.slot = 0
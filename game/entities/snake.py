@@ -1,26 +1,110 @@
 # entities/snake.py
 import random
-import core.config as config
+import itertools
+import core.config as default_config
+from collections import namedtuple
 from core import algorithms, genes
+from core.spatial import EMPTY
+from entities.body import Body
+from entities.population import Population
+
+_snake_ids = itertools.count() # unique ids, used as occupancy grid values
+
+
+def skip_ids(next_id):
+    """Hand out ids from next_id on (if higher), e.g. after snakes were restored from a checkpoint"""
+    global _snake_ids
+    _snake_ids = itertools.count(max(next(_snake_ids), next_id))
+
+
+def peek_id():
+    """The id the next snake will get, without handing it out"""
+    global _snake_ids
+    next_id = next(_snake_ids)
+    _snake_ids = itertools.count(next_id)
+    return next_id
+
+# everything a path search needs from a snake - picklable, so it can be sent to a decision pool worker
+PlanJob = namedtuple("PlanJob", [
+    "snake_id", "algorithm", "position", "direction", "vision_range",
+    "timidity", "body", "food_positions", "prefix",
+])
+
+
+def plan_path(grid, job, halo=None):
+    """Run the search described by a PlanJob - used by the serial loop and the decision pool workers"""
+    algorithm = getattr(algorithms, job.algorithm)
+    obstacles = set(job.body[1:-1]) # own head and tail not obstacles
+    if halo is not None:
+        obstacles |= halo.tiles() if hasattr(halo, "tiles") else halo
+
+    path = None
+    if job.prefix:
+        path = repair_path(grid, job, algorithm, obstacles)
+    if path is None:
+        path = algorithm(grid, job.position, job.food_positions, job.vision_range, obstacles, job.direction)
+    return path
+
+
+def repair_path(grid, job, algorithm, obstacles):
+    """Keep the clear part of the path and search again only from its last tile"""
+    prefix = job.prefix
+    origin = prefix[-1]
+    previous = prefix[-2] if len(prefix) > 1 else job.position
+    direction = (origin[0] - previous[0], origin[1] - previous[1])
+    # a smaller radius around origin stays inside the snake's own vision range
+    budget = job.vision_range - algorithms.manhattan(job.position, origin)
+    if budget < 0: # path wandered out of sight, e.g. after following a moving target
+        return None
+    detour = algorithm(
+        grid, origin, job.food_positions, budget, obstacles.union(prefix, [job.position]), direction
+    )
+    if not detour:
+        return None
+    return prefix + detour
+
+
+def _column(name):
+    """Property reading and writing this snake's cell of a Population column"""
+    def get(self):
+        return getattr(self.population, name)[self.slot].item()
+    def set(self, value):
+        getattr(self.population, name)[self.slot] = value
+    return property(get, set)
+
+
+def _trait(name):
+    """Read-only property mapping a categorical gene column back to its decoded trait"""
+    def get(self):
+        return genes.VALUES[name][getattr(self.population, name)[self.slot]]
+    return property(get)
+
 
 class Snake:
-    """Snake entity class"""
-    def __init__(self, position, direction, color, parent1=None, parent2=None):
+    """Snake entity class - a view of one row of a Population, plus its body and path"""
+    chr = _column("chr")
+    energy = _column("energy")
+    energy_since_last_shrink = _column("energy_since_last_shrink")
+    score = _column("score")
+    length = _column("length")
+    alive = _column("alive")
+    vision_range = _column("vision_range")
+    mutability = _column("mutability")
+    exploration = _column("exploration")
+    max_energy = _column("max_energy")
+    timidity = _column("timidity")
+    toxic_resistance = _column("toxic_resistance")
+    algorithm = _trait("algorithm")
+    toxic_reaction = _trait("toxic_reaction")
+    food_preference = _trait("food_preference")
+
+    def __init__(self, position, direction, color, parent1=None, parent2=None, config=None, population=None):
+        config = config if config is not None else default_config
+        population = population if population is not None else Population(config, capacity=1)
+        self.attach(population, population.add(self), position, direction, color, config)
         self.position = position
         self.direction = direction
-        dx, dy = direction
-        self.body = [
-            position,
-            (position[0] - dx, position[1] - dy),
-            (position[0] - 2*dx, position[1] - 2*dy)
-        ]
-        self.color = color
-        self.score = 0
-        self.alive = True
-        self.energy_since_last_shrink = 0
-        self.path = []
-        self.step = 0
-        self.just_ate = False
+        self.length = 3
 
         if parent1 and parent2:
             self.chr = genes.crossover(parent1.chr, parent2.chr)
@@ -31,155 +115,260 @@ class Snake:
         self.decode_genes()
 
 
+    @classmethod
+    def spawn_batch(cls, population, chromosomes, positions, directions, colors, config=None):
+        """Create one snake per chromosome, writing their rows in bulk - positions and directions are (n, 2) arrays"""
+        config = config if config is not None else default_config
+        slots = population.reserve(len(chromosomes))
+        population.chr[slots] = chromosomes
+        population.x[slots], population.y[slots] = positions[:, 0], positions[:, 1]
+        population.dx[slots], population.dy[slots] = directions[:, 0], directions[:, 1]
+        population.length[slots] = 3
+        population.decode(slots)
+        population.energy[slots] = population.max_energy[slots]
+
+        snakes = []
+        for slot, position, direction, color in zip(slots.tolist(), positions.tolist(), directions.tolist(), colors):
+            snake = cls.__new__(cls)
+            snake.attach(population, slot, tuple(position), tuple(direction), color, config)
+            snakes.append(snake)
+        population.snakes.extend(snakes)
+        return snakes
+
+
+    def attach(self, population, slot, position, direction, color, config):
+        """Set up the parts of a snake that live outside its population row"""
+        self.id = next(_snake_ids)
+        self.config = config
+        self.population = population
+        self.slot = slot
+        dx, dy = direction
+        self.body = Body([
+            position,
+            (position[0] - dx, position[1] - dy),
+            (position[0] - 2*dx, position[1] - 2*dy)
+        ])
+        self.color = color
+        self.path = []
+        self.step = 0 # index of the next path tile
+        self.target_food = None # food at the end of the path
+        self.known_foods = set() # foods in sight when the path was planned
+        self.pending_foods = None # sorted visible foods of a PlanJob waiting for its path
+        self.just_ate = False
+
+
+    @property
+    def position(self):
+        slot = self.slot
+        population = self.population
+        return (int(population.x[slot]), int(population.y[slot]))
+
+
+    @position.setter
+    def position(self, value):
+        self.population.x[self.slot], self.population.y[self.slot] = value
+
+
+    @property
+    def direction(self):
+        slot = self.slot
+        population = self.population
+        return (int(population.dx[slot]), int(population.dy[slot]))
+
+
+    @direction.setter
+    def direction(self, value):
+        self.population.dx[self.slot], self.population.dy[self.slot] = value
+
+
 
     def decode_genes(self):
         """Decode bit gene values into traits"""
-        traits = genes.decode_chromosome(self.chr)
-        self.algorithm = traits["algorithm"]
-        self.vision_range = traits["vision_range"]
-        self.mutability = traits["mutability"]
-        self.exploration = traits["exploration"]
-        self.max_energy = traits["max_energy"]
+        self.population.decode(self.slot)
         self.energy = self.max_energy
-        self.timidity = traits["timidity"]
-        self.toxic_reaction = traits["toxic_reaction"]
-        self.toxic_resistance = traits["toxic_resistance"]
-        self.food_preference = traits["food_preference"]
-        return traits
 
 
 
     def mutate(self):
         """Mutate 1 bit within chromosome"""
-        start, length = genes.LAYOUT["mutability"]
-        if random.random() < genes.DECODER["mutability"][genes.extract(self.chr, start, length)]:
+        if random.random() < genes.traits_of(self.chr)["mutability"]:
             self.chr = genes.mutate(self.chr, random.randint(0, genes.CHROMOSOME_LENGTH - 1))
 
 
 
-    def decide_movement(self, grid, foods, other_bodies=None):
-        """Call pathfinding algorithm and decide a path to follow"""
-        if other_bodies is None:
-            other_bodies = set()
-        
-        expanded_obstacles = set()
-        for pos in other_bodies:
-            for dx in range(-self.timidity, self.timidity + 1): # expand/narrow obstacle area based on timidity
-                for dy in range(-self.timidity, self.timidity + 1):
-                    nx, ny = pos[0] + dx, pos[1] + dy
-                    if 0 <= nx < grid.shape[0] and 0 <= ny < grid.shape[1]:
-                        expanded_obstacles.add((nx, ny))
-        
-        obstacles = expanded_obstacles.union(set(self.body[1:-1])) # own head and tail not obstacles
-        
+    def decide_movement(self, grid, foods, halo=None):
+        """Keep following the current path while it is still valid, otherwise repair or replan it.
+
+        halo holds the tiles within timidity range of other snakes (World.halo_obstacles);
+        it is only expanded to a full tile set when a search actually runs.
+        """
+        job = self.plan_job(foods, halo)
+        if job is not None:
+            self.apply_plan(plan_path(grid, job, halo))
+
+
+
+    def plan_job(self, foods, halo=None):
+        """Check the current path against this tick's world, return a PlanJob if a search is needed"""
         visible_food = algorithms.foods_in_vision(self.position, foods, self.vision_range)
+        if not visible_food:
+            self.path = []
+            self.step = 0
+            self.target_food = None
+            return None
+
+        self.track_target()
+        if not self.path_outdated(foods, visible_food):
+            blocked_at = self.first_blocked(halo)
+            if blocked_at is None: # nothing changed along the path - keep following it
+                return None
+        else:
+            blocked_at = None
+
         # sort food based on preference
         if self.food_preference == "high":
             visible_food.sort(key=lambda f: -f.energy_factor)
         elif self.food_preference == "low":
             visible_food.sort(key=lambda f: f.energy_factor)
+        self.pending_foods = visible_food
 
-        if visible_food:
-            food_positions = [f.position for f in visible_food]
-            if food_positions:
-                self.path = self.algorithm(
-                    grid, self.position, food_positions, self.vision_range, obstacles, self.direction
-                )
-        else:
-            self.path = []
-            
+        prefix = [] # clear part of a blocked path that is kept and repaired from its last tile
+        if blocked_at is not None and blocked_at > self.step:
+            prefix = self.path[self.step:blocked_at]
+        return PlanJob(
+            self.id, self.algorithm.__name__, self.position, self.direction, self.vision_range,
+            self.timidity, list(self.body), [f.position for f in visible_food], prefix
+        )
+
+
+
+    def apply_plan(self, path):
+        """Start following a path computed for the last PlanJob"""
+        visible_food = self.pending_foods
+        self.pending_foods = None
+        self.path = path
         self.step = 0
+        self.known_foods = set(visible_food)
+        self.target_food = next((f for f in visible_food if path and f.position == path[-1]), None)
+
+
+
+    def track_target(self):
+        """Follow a target food that moved by one tile by extending or trimming the end of the path"""
+        target = self.target_food
+        if not self.path or target is None or target.position == self.path[-1]:
+            return
+        if algorithms.manhattan(self.path[-1], target.position) != 1:
+            return
+        if len(self.path) - self.step >= 2 and self.path[-2] == target.position: # moved towards the snake
+            self.path.pop()
+        elif algorithms.manhattan(self.position, target.position) <= self.vision_range:
+            self.path.append(target.position)
+
 
 
+    def path_outdated(self, foods, visible_food):
+        """Check if the target food is gone or a new food came into sight since planning"""
+        if not self.path or self.step >= len(self.path):
+            return True
+        target = self.target_food
+        if target is None or target not in foods or target.position != self.path[-1]: # eaten or moved
+            return True
+        return any(f not in self.known_foods for f in visible_food)
 
-    def move(self, grid, other_bodies=None, other_snakes=None):
-        """Move snake on the grid"""
-        if other_bodies is None:
-            other_bodies = set()
 
-        collision_bodies = other_bodies.union(set(self.body[1:-1])) # own head and tail not obstacles
 
+    def first_blocked(self, halo=None):
+        """Index of the first remaining path tile that became an obstacle, None if the path is clear"""
+        body = self.body
+        for i in range(self.step, len(self.path)):
+            tile = self.path[i]
+            if body.interior_contains(tile) or (halo is not None and tile in halo): # own head and tail not obstacles
+                return i
+        return None
+
+
+
+    def collides(self, pos, grid, occupancy):
+        """Check if a position is out of bounds, impassable or taken by a snake body"""
+        if not (0 <= pos[0] < grid.shape[0] and 0 <= pos[1] < grid.shape[1]):
+            return True
+        if grid[pos] == 999:
+            return True
+        owner = occupancy[pos]
+        if owner == EMPTY:
+            return False
+        if owner != self.id: # other snakes' bodies and heads
+            return True
+        # own body: head and (non-duplicated) tail are not obstacles
+        return pos != self.body[0] and not (pos == self.body[-1] and self.body.counts[pos] == 1)
+
+
+
+    def move(self, world):
+        """Move snake on the grid, keeping the world's occupancy grid and free tiles up to date"""
+        grid, occupancy = world.grid, world.occupancy
         next_pos = None 
         if self.path and self.step < len(self.path): # if still on path
             next_pos = self.path[self.step]
-            if not (0 <= next_pos[1] < grid.shape[1] and  # check out of bounds/impassable tiles/other snakes
-                    0 <= next_pos[0] < grid.shape[0]) or \
-                    grid[next_pos[0]][next_pos[1]] == 999 or \
-                    next_pos in collision_bodies:
+            if self.collides(next_pos, grid, occupancy): # check out of bounds/impassable tiles/other snakes
                 next_pos = None
                 self.path = []
                 self.step = 0
+            else:
+                self.step += 1
 
         if next_pos is None: # no valid path towards food found
-            next_pos = self.get_fallback_move(grid, collision_bodies)
+            next_pos = self.get_fallback_move(grid, occupancy)
 
-        # head to head collision detection
-        other_heads = {s.position for s in other_snakes if s != self and s.alive}
-        if (next_pos in collision_bodies) or (next_pos in other_heads):
+        # wall, mountain peak, head to head and head to body collision detection
+        if self.collides(next_pos, grid, occupancy):
             self.alive = False
             return False
 
-        # head to body collision detection
-        if next_pos in collision_bodies:
-            self.alive = False
-            return False
-
-        # wall collision detection
-        if not (0 <= next_pos[1] < grid.shape[1] and 0 <= next_pos[0] < grid.shape[0]):
-            self.alive = False
-            return False
-
-        # mountain peak collision detection
-        if grid[next_pos[0]][next_pos[1]] == 999:
-            self.alive = False
-            return False
-
-        self.position = next_pos # move
-        self.body.insert(0, self.position)
-
         if not self.just_ate:
-            self.body.pop() # remove tail so the snake doesn't grow every move
+            self.release(self.body.pop_tail(), world) # remove tail so the snake doesn't grow every move
         else: 
             self.just_ate = False # snake grows by 1 tile
+            self.length += 1
 
-        terrain_cost = max(1, grid[self.position[0]][self.position[1]])
-        self.energy -= terrain_cost
-        self.energy_since_last_shrink += terrain_cost
+        self.position = next_pos # move
+        self.body.push_head(next_pos)
+        world.occupy(next_pos, self.id)
+        return True # energy, shrinking and deaths are settled for all snakes at once in Population.spend_energy
 
-        if self.energy_since_last_shrink >= config.SHRINK_ENERGY_INTERVAL and len(self.body) > 3:
-            shrink_count = self.energy_since_last_shrink // config.SHRINK_ENERGY_INTERVAL
-            shrink_count =  min(int(shrink_count), len(self.body) - 1)
-            self.body = self.body[:-shrink_count]
-            self.energy_since_last_shrink %= config.SHRINK_ENERGY_INTERVAL
 
-        if self.energy <= 0: # no energy => death
-            self.alive = False
-            return False
+    def shrink(self, count, world):
+        """Drop count tail segments"""
+        removed = self.body.trim_tail(count)
+        self.length -= count
+        for pos in removed:
+            self.release(pos, world)
 
-        if len(self.body) < 3: # length < 3 => death
-            self.alive = False
-            return False
-        
-        return True
+
+    def release(self, pos, world):
+        """Free a tile left by the tail unless another segment (a duplicated tail) still covers it"""
+        if pos in self.body:
+            return
+        world.vacate(pos, self.id)
 
 
     def grow(self):
         """Grow snake by 1 tile"""
         self.score += 1
         self.body.append(self.body[-1])
+        self.length += 1
         self.just_ate = True
 
 
-    def get_fallback_move(self, grid, collision_bodies):
+    def get_fallback_move(self, grid, occupancy):
         """Move in absence of food or a valid path"""
         directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # up, down, left, right
         safe_moves = []
 
         for dx, dy in directions: # get safe moves checking for collisions
-            nx, ny = self.position[0] + dx, self.position[1] + dy
-            if 0 <= nx < grid.shape[0] and 0 <= ny < grid.shape[1]:
-                if grid[nx][ny] != 999 and (nx, ny) not in collision_bodies:
-                    safe_moves.append((dx, dy))
+            if not self.collides((self.position[0] + dx, self.position[1] + dy), grid, occupancy):
+                safe_moves.append((dx, dy))
 
         if safe_moves:
             if random.random() <= self.exploration:
@@ -0,0 +1,49 @@
+import argparse
+import time
+from simulation.engine import Simulation
+from core.config import Config
+import core.config as config
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the snake simulation without a display or FPS cap")
+    parser.add_argument("--generations", type=int, default=10, help="number of generations to simulate")
+    parser.add_argument("--ticks", type=int, default=None, help="stop after this many ticks instead")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for a reproducible run")
+    parser.add_argument("--world", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        default=(config.WORLD_WIDTH, config.WORLD_HEIGHT), help="map size in tiles")
+    parser.add_argument("--workers", type=int, default=config.PARALLEL_WORKERS,
+                        help="worker processes for the path searches (0 = search in the main process)")
+    parser.add_argument("--checkpoint-every", type=int, default=config.CHECKPOINT_EVERY,
+                        help=f"save the simulation state to {config.CHECKPOINT_FILE} every N generations (0 = never)")
+    parser.add_argument("--trace", default=config.TRACE_FILE or None,
+                        help="record every tick's events to this file, to be watched with replay.py")
+    parser.add_argument("--profile", action="store_true", default=config.PROFILE,
+                        help=f"time every tick phase and count the searches' work, written to {config.PROFILE_FILE}")
+    parser.add_argument("--resume", metavar="CHECKPOINT", default=None,
+                        help="continue a saved simulation (with its settings) instead of starting a new one")
+    args = parser.parse_args()
+
+    if args.resume is not None:
+        simulation = Simulation.from_checkpoint(args.resume)
+        print(f"Resuming headless simulation at generation {simulation.generation}, tick {simulation.tick_count}")
+    else:
+        width, height = args.world
+        print(f"Starting headless simulation with {config.SNAKE_COUNT} snakes in a {width}x{height} grid")
+        simulation = Simulation(seed=args.seed, config=Config(
+            WORLD_WIDTH=width, WORLD_HEIGHT=height, PARALLEL_WORKERS=args.workers, CHECKPOINT_EVERY=args.checkpoint_every, TRACE_FILE=args.trace or "",
+            PROFILE=args.profile
+        ))
+    start = time.perf_counter()
+    if args.ticks is not None:
+        simulation.run_until(tick=args.ticks)
+    else:
+        simulation.run_until(generation=args.generations)
+    elapsed = time.perf_counter() - start
+    if simulation.profiler is not None: # the numbers since the last exported line
+        print("\n".join(simulation.profiler.lines()))
+    simulation.close()
+    print(f"Finished at generation {simulation.generation}, tick {simulation.tick_count} "
+          f"({simulation.tick_count / max(elapsed, 1e-9):.1f} ticks/sec)")
+
+if __name__ == "__main__":
+    main()
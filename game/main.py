@@ -2,7 +2,7 @@ from simulation.controller import GameController
 import core.config as config
 
 def main():
-    print(f"Starting simulation with {config.SNAKE_COUNT} snakes in a {config.WINDOW_WIDTH // config.TILE_SIZE}x{config.WINDOW_HEIGHT // config.TILE_SIZE} grid")
+    print(f"Starting simulation with {config.SNAKE_COUNT} snakes in a {config.WORLD_WIDTH}x{config.WORLD_HEIGHT} grid")
     controller = GameController()
     controller.run()
     
@@ -0,0 +1,34 @@
+import argparse
+import time
+from simulation.trace import TraceReplay
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a recorded trace (see TRACE_FILE in core/config.py) without re-running the simulation")
+    parser.add_argument("trace", help="trace file written by a simulation run")
+    parser.add_argument("--tick", type=int, default=None, help="start at this tick")
+    parser.add_argument("--generation", type=int, default=None, help="start at the beginning of this generation")
+    parser.add_argument("--speed", type=int, default=1, help="multiple of TICKS_PER_SECOND to replay at (up/down arrows change it)")
+    parser.add_argument("--headless", action="store_true", help="replay the whole trace without a display and report the speed")
+    args = parser.parse_args()
+
+    replay = TraceReplay(args.trace)
+    if args.generation is not None:
+        replay.seek_generation(args.generation)
+    if args.tick is not None:
+        replay.seek(args.tick)
+
+    if args.headless:
+        start = time.perf_counter()
+        ticks = replay.step(float("inf"))
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {ticks} ticks up to generation {replay.generation}, tick {replay.tick_count} "
+              f"({ticks / max(elapsed, 1e-9):.1f} ticks/sec)")
+        return
+
+    from simulation.controller import ReplayController # pygame is only needed to watch
+    print(f"Replaying {args.trace} from generation {replay.generation}, tick {replay.tick_count}")
+    print("Space: pause, up/down: speed, F: fast-forward, left/right: seek, N/B: next/previous generation")
+    ReplayController(replay, speed=args.speed).run()
+
+if __name__ == "__main__":
+    main()
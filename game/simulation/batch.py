@@ -0,0 +1,50 @@
+import contextlib
+import csv
+import io
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from core.config import Config
+from simulation.engine import Simulation, STATS_COLUMNS
+
+
+def expand_grid(grid):
+    """Turn {"FOOD_NR": [30, 50], "FOOD_ENERGY": [200, 250]} into every combination of overrides"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def run_one(job):
+    """Worker: run one headless simulation and return its per-generation stats rows"""
+    run_id, overrides, seed, generations = job
+    with contextlib.redirect_stdout(io.StringIO()): # the engine prints every generation
+        simulation = Simulation(seed=seed, config=Config(**overrides), log_files=False)
+        simulation.run_until(generation=generations)
+        simulation.close()
+    return [
+        {"run": run_id, "seed": seed, **overrides, **dict(zip(STATS_COLUMNS, row))}
+        for row in simulation.stats_history
+    ]
+
+
+def run_batch(override_sets, seeds, generations, workers=None):
+    """Run every override set with every seed on a process pool and merge the results"""
+    jobs = [
+        (run_id, overrides, seed, generations)
+        for run_id, (overrides, seed) in enumerate(itertools.product(override_sets, seeds))
+    ]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for run_rows in pool.map(run_one, jobs):
+            rows.extend(run_rows)
+    return rows
+
+
+def write_summary(rows, path):
+    """Write the merged rows of a batch to one CSV file"""
+    columns = []
+    for row in rows: # override columns can differ between runs
+        columns.extend(c for c in row if c not in columns)
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,180 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import time
+import numpy as np
+from core import algorithms
+from core.config import Config
+from simulation.engine import Simulation
+from simulation.world import START_DIRECTIONS, perlin_terrain
+
+# micro-benchmarks: every pathfinder on every combination of these
+ALGORITHMS = ["greedy", "bfs", "ucs", "a_star"]
+VISION_RANGES = [10, 15, 20]
+FOOD_COUNTS = [1, 5, 20]               # foods in sight of the searching snake
+OBSTACLE_DENSITIES = [0.0, 0.1, 0.25]  # share of the tiles in sight taken by snake bodies
+TERRAIN_SEEDS = [11, 42, 271]          # seeded Perlin terrains the searches run on
+TERRAIN_SIZE = 200
+
+# macro-benchmarks: whole simulation ticks - (name, grid side in tiles, snakes, foods, ticks timed)
+SCALES = [
+    ("100x100", 100, 25, 50, 200),
+    ("200x200", 200, 100, 200, 50),
+    ("300x300", 300, 300, 600, 20),
+    ("500x500", 500, 1000, 2000, 10),
+    ("5000x5000", 5000, 1000, 2000, 10), # chunked world, terrain generated where it is used
+]
+
+
+def search_queries(grid, vision_range, food_count, density, count, rng):
+    """Random searches like the ones snakes run: (start, goals, obstacles, direction) with everything in sight"""
+    passable = np.argwhere(grid != 999).tolist()
+    rows, cols = grid.shape
+    offsets = [
+        (dx, dy) for dx in range(-vision_range, vision_range + 1)
+        for dy in range(abs(dx) - vision_range, vision_range - abs(dx) + 1) if (dx, dy) != (0, 0)
+    ]
+    queries = []
+    for start in rng.choice(len(passable), count).tolist():
+        sx, sy = passable[start]
+        sight = [(sx + dx, sy + dy) for dx, dy in offsets if 0 <= sx + dx < rows and 0 <= sy + dy < cols]
+        order = rng.permutation(len(sight)).tolist()
+        foods = [sight[i] for i in order if grid[sight[i]] != 999][:food_count] # foods never lie on peaks
+        food_set = set(foods)
+        others = [sight[i] for i in order if sight[i] not in food_set]
+        obstacles = set(others[:int(density * len(sight))])
+        direction = START_DIRECTIONS[int(rng.integers(len(START_DIRECTIONS)))]
+        queries.append(((sx, sy), foods, vision_range, obstacles, direction))
+    return queries
+
+
+@contextlib.contextmanager
+def no_gc():
+    """Keep garbage collection pauses out of a timing, like timeit does"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def best_time(calls, repeats):
+    """Seconds per call of a list of (function, args), the fastest of repeats runs"""
+    best = float("inf")
+    with no_gc():
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for function, args in calls:
+                function(*args)
+            best = min(best, time.perf_counter() - start)
+    return best / max(len(calls), 1)
+
+
+def run_micro(queries=60, repeats=7, seed=0):
+    """Time every pathfinder per vision range, food count and obstacle density - {name: result}"""
+    terrains = [perlin_terrain(TERRAIN_SIZE, TERRAIN_SIZE, s) for s in TERRAIN_SEEDS]
+    results = {}
+    for vision_range in VISION_RANGES:
+        for food_count in FOOD_COUNTS:
+            for density in OBSTACLE_DENSITIES:
+                rng = np.random.default_rng(seed) # every algorithm searches the same queries
+                cases = [
+                    (grid, query) for grid in terrains
+                    for query in search_queries(grid, vision_range, food_count, density, queries // len(terrains), rng)
+                ]
+                for name in ALGORITHMS:
+                    algorithm = getattr(algorithms, name)
+                    calls = [(algorithm, (grid,) + query) for grid, query in cases]
+                    paths = [algorithm(*args) for _, args in calls] # also warms up the search workspaces
+                    found = [path for path in paths if path]
+                    key = f"micro/{name}/vision{vision_range}/foods{food_count}/obstacles{density:.2f}"
+                    results[key] = {
+                        "seconds": best_time(calls, repeats),
+                        "found": len(found) / len(paths),
+                        "path_length": float(np.mean([len(p) for p in found])) if found else 0.0,
+                    }
+    return results
+
+
+def run_macro(scales=None, generations=3, seed=0):
+    """Time simulation ticks and generation turnover at several world sizes - {name: result}"""
+    results = {}
+    for name, side, snakes, foods, ticks in SCALES:
+        if scales and name not in scales:
+            continue
+        config = Config(
+            WORLD_WIDTH=side, WORLD_HEIGHT=side, SNAKE_COUNT=snakes, FOOD_NR=foods
+        )
+        with contextlib.redirect_stdout(io.StringIO()): # the engine prints every generation
+            start = time.perf_counter()
+            simulation = Simulation(seed=seed, config=config, log_files=False)
+            setup = time.perf_counter() - start
+            tick_times = [] # per tick, the median is robust against the odd slow tick on a busy machine
+            while len(tick_times) < ticks and simulation.running:
+                start = time.perf_counter()
+                simulation.update()
+                tick_times.append(time.perf_counter() - start)
+            turnovers = []
+            for _ in range(generations): # selection, breeding and respawning of a new generation
+                if not simulation.running:
+                    break
+                start = time.perf_counter()
+                simulation.reset_simulation()
+                turnovers.append(time.perf_counter() - start)
+            simulation.close()
+        label = f"macro/{name}/{snakes}snakes"
+        results[label + "/setup"] = {"seconds": setup}
+        results[label + "/tick"] = {
+            "seconds": float(np.median(tick_times)) if tick_times else 0.0, "ticks": len(tick_times),
+            "ticks_per_sec": len(tick_times) / max(sum(tick_times), 1e-9),
+        }
+        if turnovers:
+            results[label + "/generation"] = {"seconds": min(turnovers)}
+    return results
+
+
+def machine_info():
+    """Where a benchmark ran - results are only comparable on the same machine"""
+    return {
+        "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+        "processor": platform.processor(), "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(results, path, settings=None):
+    with open(path, "w") as f:
+        json.dump({"machine": machine_info(), "settings": settings or {}, "results": results}, f, indent=1)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def group_of(name):
+    """Benchmarks judged together: one pathfinder (micro/a_star) or one world size (macro/200x200)"""
+    return "/".join(name.split("/")[:2])
+
+
+def compare(results, baseline, tolerance=0.15):
+    """Compare results with a baseline.
+
+    Returns (name, baseline seconds, seconds, ratio) of every shared benchmark and the geometric mean ratio
+    of every group - single timings jitter too much on a busy machine, a group regresses if its mean does.
+    """
+    rows = [
+        (name, baseline[name]["seconds"], result["seconds"], result["seconds"] / max(baseline[name]["seconds"], 1e-12))
+        for name, result in results.items() if name in baseline
+    ]
+    logs = {}
+    for name, _, _, ratio in rows:
+        logs.setdefault(group_of(name), []).append(np.log(max(ratio, 1e-12)))
+    groups = {group: float(np.exp(np.mean(values))) for group, values in logs.items()}
+    regressions = {group: ratio for group, ratio in groups.items() if ratio > 1 + tolerance}
+    return rows, groups, regressions
@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import numpy as np
+from core.config import Config
+from core.spatial import FoodIndex, TileSet
+from entities.body import Body
+from entities.food import Food
+from entities.population import COLUMNS, Population
+from entities.snake import Snake, peek_id, skip_ids
+from simulation.history import STATS_SCHEMA
+from simulation.world import World
+
+VERSION = 2
+
+
+def _ragged(sequences):
+    """Flatten a list of position lists into one (n, 2) array plus per-list lengths"""
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+    flat = [pos for seq in sequences for pos in seq]
+    return np.array(flat, dtype=np.int64).reshape(-1, 2), lengths
+
+
+def _unragged(flat, lengths):
+    """Inverse of _ragged - back to lists of (x, y) tuples"""
+    flat = list(map(tuple, flat.tolist()))
+    ends = np.cumsum(lengths).tolist()
+    return [flat[end - length:end] for end, length in zip(ends, lengths.tolist())]
+
+
+def save(simulation, path):
+    """Write the full state of a simulation (between ticks) to an .npz file - numpy arrays only, no pickling"""
+    world = simulation.world
+    config = simulation.config
+    foods = list(world.foods.items)
+    food_rank = {food: i for i, food in enumerate(foods)}
+    cell_order, bucket_order = world.foods.orders()
+    snakes = simulation.snakes
+    population = simulation.population
+    n = population.size
+    colors = list(config.SNAKE_COLORS.values())
+
+    version, mt_state, gauss_next = random.getstate()
+    meta = {
+        "version": VERSION,
+        "seed": simulation.seed,
+        "generation": simulation.generation,
+        "tick_count": simulation.tick_count,
+        "running": simulation.running,
+        "terrain_seed": world.terrain_seed,
+        "random_version": version,
+        "gauss_next": gauss_next,
+        "numpy_rng": world.rng.bit_generator.state,
+        "next_snake_id": peek_id(), # not the highest living id + 1, that snake may have died
+        # plain values only - dict settings like SNAKE_COLORS come from the current config on resume
+        "config": {
+            name: getattr(config, name) for name in dir(config)
+            if name.isupper() and isinstance(getattr(config, name), (bool, int, float, str))
+        },
+    }
+
+    occupied_tiles, occupied_ids = world.occupied() # terrain is not saved, it is regenerated from its seed
+    stacked = list(world.stacked.items())
+    body_cells, body_lengths = _ragged([list(s.body) for s in snakes])
+    path_cells, path_lengths = _ragged([s.path or [] for s in snakes])
+    known = [[food_rank[f] for f in s.known_foods if f in food_rank] for s in snakes]
+    arrays = {
+        "meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+        "random_state": np.array(mt_state, dtype=np.uint32),
+        "occupied_tiles": occupied_tiles.astype(np.int64), "occupied_ids": occupied_ids.astype(np.int32),
+        "stacked_tiles": np.array([tile for tile, _ in stacked], dtype=np.int64).reshape(-1, 2),
+        "stacked_ids": np.array([i for _, ids in stacked for i in ids], dtype=np.int32),
+        "stacked_lengths": np.array([len(ids) for _, ids in stacked], dtype=np.int64),
+        "free": world.free.flat() if world.dense else np.empty(0, dtype=np.int64), # chunked worlds sample them
+        "food_position": np.array([f.position for f in foods], dtype=np.int64).reshape(-1, 2),
+        "food_chromosome": np.array([f.chromosome for f in foods], dtype=np.int64),
+        "food_cell_order": np.array(cell_order, dtype=np.int64),
+        "food_bucket_order": np.array(bucket_order, dtype=np.int64),
+        "snake_id": np.array([s.id for s in snakes], dtype=np.int64),
+        "snake_color": np.array([colors.index(s.color) for s in snakes], dtype=np.int64),
+        "snake_step": np.array([s.step for s in snakes], dtype=np.int64),
+        "snake_just_ate": np.array([s.just_ate for s in snakes], dtype=bool),
+        "snake_target": np.array([food_rank.get(s.target_food, -1) for s in snakes], dtype=np.int64),
+        "body_cells": body_cells, "body_lengths": body_lengths,
+        "path_cells": path_cells, "path_lengths": path_lengths,
+        "known_foods": np.array([i for k in known for i in k], dtype=np.int64),
+        "known_lengths": np.array([len(k) for k in known], dtype=np.int64),
+        "stats_history": np.array([tuple(row) for row in simulation.stats_history], dtype=STATS_SCHEMA),
+    }
+    for name, _ in COLUMNS:
+        arrays["population_" + name] = getattr(population, name)[:n]
+
+    temporary = path + ".tmp" # never leave a half written checkpoint behind
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+def restore(simulation, path):
+    """Fill a bare Simulation instance with the state saved in path"""
+    with np.load(path, allow_pickle=False) as data:
+        data = {name: data[name] for name in data.files}
+    meta = json.loads(data["meta"].tobytes())
+    if meta["version"] != VERSION:
+        raise ValueError(f"{path} is a version {meta['version']} checkpoint, expected version {VERSION}")
+
+    settings = meta["config"]
+    settings.pop("FLOW_FIELD", None) # removed setting, still saved by older checkpoints
+    config = Config(**settings)
+    random.setstate((meta["random_version"], tuple(data["random_state"].tolist()), meta["gauss_next"]))
+    rng = np.random.default_rng()
+    rng.bit_generator.state = meta["numpy_rng"]
+
+    world = World(config, rng=rng, terrain_seed=meta["terrain_seed"])
+    for tile, snake_id in zip(map(tuple, data["occupied_tiles"].tolist()), data["occupied_ids"].tolist()):
+        world.occupancy[tile] = snake_id
+    if "stacked_tiles" in data: # older checkpoints predate it
+        lengths = data["stacked_lengths"].tolist()
+        ends = np.cumsum(lengths).tolist()
+        ids = data["stacked_ids"].tolist()
+        for tile, end, length in zip(map(tuple, data["stacked_tiles"].tolist()), ends, lengths):
+            world.stacked[tile] = ids[end - length:end]
+    if world.dense:
+        world.free = TileSet(world.grid.shape, data["free"])
+    foods = [
+        Food(tuple(pos), chromosome=chromosome)
+        for pos, chromosome in zip(data["food_position"].tolist(), data["food_chromosome"].tolist())
+    ]
+    world.foods = FoodIndex.restore(
+        foods, data["food_cell_order"].tolist(), data["food_bucket_order"].tolist()
+    )
+
+    n = len(data["snake_id"])
+    population = Population(config, capacity=n)
+    population.reserve(n)
+    for name, _ in COLUMNS:
+        getattr(population, name)[:n] = data["population_" + name]
+    colors = list(config.SNAKE_COLORS.values())
+    bodies = _unragged(data["body_cells"], data["body_lengths"])
+    paths = _unragged(data["path_cells"], data["path_lengths"])
+    known_ends = np.cumsum(data["known_lengths"]).tolist()
+    known_foods = data["known_foods"].tolist()
+    for slot in range(n):
+        snake = Snake.__new__(Snake)
+        snake.attach(population, slot, bodies[slot][0], (0, 1), colors[int(data["snake_color"][slot])], config)
+        snake.id = int(data["snake_id"][slot])
+        snake.body = Body(bodies[slot])
+        snake.path = paths[slot]
+        snake.step = int(data["snake_step"][slot])
+        snake.just_ate = bool(data["snake_just_ate"][slot])
+        target = int(data["snake_target"][slot])
+        snake.target_food = foods[target] if target >= 0 else None
+        end = known_ends[slot]
+        snake.known_foods = {foods[i] for i in known_foods[end - int(data["known_lengths"][slot]):end]}
+        population.snakes.append(snake)
+    skip_ids(meta["next_snake_id"])
+
+    simulation.seed = meta["seed"]
+    simulation.config = config
+    simulation.world = world
+    simulation.foods = world.foods
+    simulation.population = population
+    simulation.generation = meta["generation"]
+    simulation.tick_count = meta["tick_count"]
+    simulation.running = meta["running"]
+    simulation.stats_history = [list(row) for row in data["stats_history"].tolist()]
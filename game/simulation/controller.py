@@ -1,316 +1,200 @@
+import time
 import pygame
 import core.config as config
-from core.algorithms import manhattan
-from entities.snake import Snake
-from simulation.world import World
+from simulation.engine import Simulation
 from simulation.renderer import Renderer
-import random
-from operator import attrgetter
-import csv
-import statistics
+
+PAN_KEYS = {pygame.K_w: (-1, 0), pygame.K_s: (1, 0), pygame.K_a: (0, -1), pygame.K_d: (0, 1)} # quarter views
 
 class GameController:
-    """Controls main game logic"""
-    def __init__(self):
-        self.world = World()
+    """Pygame viewer on top of the headless Simulation"""
+    def __init__(self, simulation=None):
+        self.simulation = simulation if simulation is not None else Simulation()
+        self.world = self.simulation.world
         self.renderer = Renderer(self.world)
         self.clock = pygame.time.Clock()
         self.running = False
         self.paused = False
-        self.generation = 0
-        self.tick_count = 0
-        self.snakes = []  
-        self.foods = []   
-        self.spawn_initial_snakes() 
         self.selected_entity = None
+        self.show_profile = False # profiler summary in the stats panel (P key, needs config.PROFILE)
+        self.speed = 1              # multiple of config.TICKS_PER_SECOND the simulation runs at (up/down keys)
+        self.fast_forward = False   # as many ticks per frame as the frame budget allows (F key)
+        self.skip_until = None      # generation to fast-forward to (G key)
+        self.owed_ticks = 0.0       # ticks the elapsed time asked for that did not run yet
+        self.ticks_per_second = 0.0 # simulation rate actually reached, for the stats panel
+        self.rate_window = [0, 0.0] # ticks and seconds since ticks_per_second was last measured
 
 
-    def spawn_initial_snakes(self):
-        """Spawn config.SNAKE_NR snakes"""
-        valid_starts = []
-        # Get valid positions for spawning snake entities
-        for x in range(self.world.grid.shape[0]):  # x = row
-            for y in range(self.world.grid.shape[1]):  # y = col
-                for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                    ok = True
-                    body_positions = []
-                    for i in range(3):
-                        nx, ny = x - i*dx, y - i*dy
-                        if not (0 <= nx < self.world.grid.shape[0] and 0 <= ny < self.world.grid.shape[1]):
-                            ok = False
-                            break
-                        if self.world.grid[nx][ny] == 999:
-                            ok = False
-                            break
-                        body_positions.append((nx, ny))
-                    if ok and len(set(body_positions)) == 3:
-                        valid_starts.append(((x, y), (dx, dy)))
-                        
-        spawn_count = min(config.SNAKE_COUNT, len(valid_starts))
-        if spawn_count == 0: # should not happen, in most cases at least - IF it runs, tinker with core.config.py
-            raise ValueError("No valid spawn positions available in the world")
-        
-        chosen = random.sample(valid_starts, spawn_count)
-        self.snakes = [
-            Snake(position=pos, direction=dir, color=random.choice(list(config.SNAKE_COLORS.values())))
-            for pos, dir in chosen
-        ]
-        
-        self.foods = self.world.spawn_food(config.FOOD_NR, self.snakes) # call World's spawn_food method
-        print(f"Snakes after spawn: {len(self.snakes)}")
-        return self.snakes
+    @property
+    def snakes(self):
+        return self.simulation.snakes
+
+
+    @property
+    def foods(self):
+        return self.simulation.foods
+
+
+    @property
+    def generation(self):
+        return self.simulation.generation
+
+
+    @property
+    def tick_count(self):
+        return self.simulation.tick_count
 
 
     def handle_events(self):
         """Handle keyboard and mouse events"""
         for event in pygame.event.get():
-            if not self.snakes:
-                return
-            
             if event.type == pygame.QUIT:
                 self.running = False
                 
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     self.paused = not self.paused
+                else:
+                    self.handle_key(event.key)
                     
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = pygame.mouse.get_pos()
-                if mx < config.WINDOW_WIDTH and my < config.WINDOW_HEIGHT:
-                    grid_x = my // config.TILE_SIZE
-                    grid_y = mx // config.TILE_SIZE
-                    self.selected_entity = None
-                    for snake in self.snakes: # check if clicked on a snake
-                        if (grid_x, grid_y) in snake.body:
-                            self.selected_entity = snake
-                            break
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.snakes:
+                mx, my = event.pos
+                if self.renderer.map_rect.collidepoint(mx, my): # clicks on the map, not the stats panel
+                    tile = self.renderer.camera.tile_at(mx, my) # same transform the map is drawn with
+                    self.selected_entity = self.world.snake_at(tile, self.snakes) # check if clicked on a snake
                     if self.selected_entity is None: # no snake => maybe food
-                        for food in self.foods:
-                            if food.position == (grid_x, grid_y):
-                                self.selected_entity = food
-                                break
-
-
-    def reset_simulation(self):
-        """Reset current world state and begin a new generation of snakes"""
-        top_snakes = sorted(self.snakes, key=lambda s: (
-            config.LENGTH_WEIGHT * len(s.body) +
-            config.SCORE_WEIGHT * s.score +
-            config.ENERGY_WEIGHT * (s.energy // 100)
-        ), reverse=True)[:3]
-        
-        with open("snake_log.txt", "a") as f: # generation data logging
-            f.write(f"\nGeneration {self.generation} top 3:\n\n")
-            for i, snake in enumerate(top_snakes, 1):
-                chr_bin = format(snake.chr, '020b')
-                f.write(
-                    f"#{i} Chr: {chr_bin}\nAlgorithm: {snake.algorithm.__name__}\n"
-                )
-                f.write(
-                    f"Fitness: {config.LENGTH_WEIGHT * len(snake.body) +
-                    config.SCORE_WEIGHT * snake.score +
-                    config.ENERGY_WEIGHT * (snake.energy // 100)}"
-                )
-                f.write(
-                    f"\nVision Ramge: {snake.vision_range} tiles\nExploration: {snake.exploration}"
-                )
-                f.write(
-                    f"\nMax Energy: {snake.max_energy}\nTimidity: {snake.timidity}"
-                )
-                f.write(
-                    f"Toxic Reaction: {snake.toxic_reaction}\nToxic Penalty Scale: {snake.toxic_resistance}"
-                )
-                f.write(
-                    f"Food preference: {snake.food_preference}\n\n"
-                )
-        print(f"Top snakes logged for generation {self.generation}")
-        
-        # --- STATISTICS FOR LATER USE ---
-        if not self.snakes:
-            self.running = False
-            return
-        
-        fitnesses = [float(config.LENGTH_WEIGHT * int(len(s.body)) +
-             config.SCORE_WEIGHT * int(s.score) +
-             config.ENERGY_WEIGHT * int(s.energy // 100))
-             for s in self.snakes]
-        energies = [float(s.energy) for s in self.snakes]
-        chromos = [s.chr for s in self.snakes]
-        unique_chromos = len(set(chromos))
-        stats_row = [
-            self.generation,
-            statistics.mean(fitnesses) if fitnesses else 0,
-            max(fitnesses) if fitnesses else 0,
-            min(fitnesses) if fitnesses else 0,
-            statistics.median(fitnesses) if fitnesses else 0,
-            statistics.mean(energies) if energies else 0,
-            unique_chromos,
-            len(self.snakes)
-        ]
-        
-        with open("stats.csv", "a", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            if csvfile.tell() == 0: 
-                writer.writerow([
-                    "generation", "avg_fitness", "max_fitness", "min_fitness", "median_fitness",
-                    "avg_energy", "unique_chromosomes", "num_snakes",
-                ])
-            writer.writerow(stats_row)
-            
-        with open("genes.csv", "a", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            if csvfile.tell() == 0: 
-                writer.writerow([
-                    "generation", "chromosome", "fitness"
-                ])
-            for s in self.snakes:
-                fitness = (config.LENGTH_WEIGHT * len(s.body) +
-                        config.SCORE_WEIGHT * s.score +
-                        config.ENERGY_WEIGHT * (s.energy // 100))
-                writer.writerow([self.generation, s.chr, fitness])
-        
-        print(f"Alive snakes: {sum(1 for s in self.snakes if s.alive)}")
-        self.generation += 1
-        print(f"Generation {self.generation}")
-        self.snakes = self.evolve_snakes()
-
-        survivor_foods = self.foods[:]  # keep current foods
-        needed = config.FOOD_NR - len(survivor_foods)
-        if needed > 0:
-            new_foods = self.world.spawn_food(needed, self.snakes, survivor_foods)
-            self.foods = survivor_foods + new_foods
-        else:
-            self.foods = survivor_foods
-        
+                        self.selected_entity = self.foods.first_at(tile)
 
-    def evolve_snakes(self):
-        """Evolve survivor snakes and return a new generation"""
-        if not self.snakes:
+            elif event.type == pygame.MOUSEWHEEL: # zoom in/out at the mouse pointer
+                mx, my = pygame.mouse.get_pos()
+                if self.renderer.map_rect.collidepoint(mx, my):
+                    self.renderer.camera.zoom(event.y, (mx, my))
+
+            elif event.type == pygame.MOUSEMOTION and (event.buttons[1] or event.buttons[2]): # drag the map around
+                self.renderer.camera.pan_pixels(*event.rel)
+
+
+    @property
+    def profiler(self):
+        return getattr(self.simulation, "profiler", None)
+
+
+    def handle_key(self, key):
+        """Keys other than pause: up/down double/halve the speed, F fast-forwards, G skips to the next generation,
+        P shows/hides the profiler summary, WASD pan, +/- zoom, C centers on the selection"""
+        camera = self.renderer.camera
+        if key == pygame.K_UP:
+            self.speed *= 2
+        elif key == pygame.K_DOWN:
+            self.speed = max(1, self.speed // 2)
+        elif key == pygame.K_f:
+            self.fast_forward = not self.fast_forward
+        elif key == pygame.K_g:
+            self.skip_until = self.generation + 1
+        elif key == pygame.K_p:
+            self.show_profile = not self.show_profile
+        elif key in PAN_KEYS:
+            dx, dy = PAN_KEYS[key]
+            camera.pan(dx * max(1, camera.view_rows // 4), dy * max(1, camera.view_cols // 4))
+        elif key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            camera.zoom(1)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            camera.zoom(-1)
+        elif key == pygame.K_c and self.selected_entity is not None:
+            camera.center_on(self.selected_entity.position)
+
+
+    def advance(self, ticks):
+        """Run up to ticks simulation ticks, return how many ran - the end of the simulation ends the viewer"""
+        done = 0
+        while done < ticks and self.simulation.running:
+            self.simulation.update()
+            done += 1
+        if not self.simulation.running:
             self.running = False
-            return
+        return done
 
-        for snake in self.snakes:
-            snake.fitness = len(snake.body) * config.LENGTH_WEIGHT + snake.score * config.SCORE_WEIGHT + (snake.energy//100) * config.ENERGY_WEIGHT
-        
-        num_snakes = len(self.snakes)
-        if num_snakes < 2:
-            self.running = False
-            return
-        
-        def get_selected_count(survived_nr):
-            if survived_nr in range(2, 5):
-                return 2
-            elif survived_nr in range(6, 17):
-                return 3
-            else:
-                return survived_nr//5 # 20%
-            
-        selected_count = get_selected_count(num_snakes)
-        survivors = sorted(self.snakes, key=attrgetter('fitness'), reverse=True)[:selected_count]
-        
-        print(f"{len(survivors)} snakes survived. Yay!")
-        new_snakes = []
-        
-        # Create offspring from survivors
-        for _ in range(config.SNAKE_COUNT + random.randint(-1, 1) * config.SNAKE_COUNT//4): # chance to spawn more or less snakes for each generation
-            parent1 = random.choice(survivors)
-            parent2 = random.choice(survivors)
-            while parent2 == parent1 and len(survivors) > 1:
-                parent2 = random.choice(survivors)
-                
-            valid_tiles = [
-                (x, y)
-                for x in range(self.world.grid.shape[0])
-                for y in range(self.world.grid.shape[1])
-                if self.world.grid[x][y] != 999
-            ]
-            spawn_pos = random.choice(valid_tiles)
-            
-            new_snakes.append(
-                Snake(position=spawn_pos,
-                      direction=random.choice([(1, 0), (-1, 0), (0, 1), (0, -1)]),
-                      color=random.choice(list(config.SNAKE_COLORS.values())),
-                      parent1=parent1,
-                      parent2=parent2)
-            )
-        return new_snakes
 
+    def update(self, elapsed=None):
+        """Advance the simulation for one displayed frame, elapsed seconds after the last one, and return the ticks run.
 
-    def update(self):
-        """Update game state by one tick"""
+        At normal speed that is the ticks elapsed asks for at TICKS_PER_SECOND x speed, fast-forward and generation skips
+        run as many as they can. Simulating stops once the frame's FRAME_SIM_BUDGET is used up either way: a machine
+        too slow for the speed falls behind instead of piling up ticks it can never catch up on.
+        """
         if self.paused:
-            return
-        self.tick_count += 1
-        
-        if not self.snakes:
-            self.running = False
-            return
-        
-        all_bodies = {pos for s in self.snakes if s.alive for pos in s.body} # 'NoneType' object is not iterable - why is self.snakes None???
-
-        # Decide movements for all snakes
-        for snake in self.snakes:
-            if not snake.alive:
-                continue
-            other_bodies = {
-                pos for pos in all_bodies - set(snake.body)
-                if manhattan(snake.position, pos) <= snake.vision_range
-            }
-            snake.decide_movement(self.world.grid, self.foods, other_bodies)
-
-        for snake in self.snakes:
-            if not snake.alive:
-                continue
-            other_bodies = all_bodies - set(snake.body)
-            moved = snake.move(self.world.grid, other_bodies, self.snakes)
-            if not moved:
-                continue
-                
-            for food in self.foods[:]: 
-                if snake.position == food.position: # snake ate some food
-                    if food.toxic == False:
-                        snake.grow()
-                        snake.energy += config.FOOD_ENERGY
-                        snake.energy = min(snake.energy, snake.max_energy)
-                    else:
-                        penalty = food.energy_factor * config.FOOD_ENERGY * snake.toxic_resistance
-                        snake.energy -= penalty
-                        snake.energy_since_last_shrink += penalty
-                        snake.score += 3
-                    self.foods.remove(food)
-                    break
-            
-        for food in self.foods[:]: 
-            food.move(self.world.grid, self.snakes)
-
-        self.snakes = [s for s in self.snakes if s.alive] # remove dead snakes
-
-        # Check for extinction
-        if not self.snakes: 
-            self.running = False
-            return
-
-        # food respawn
-        if self.tick_count % config.FOOD_RESPAWN_RATE == 0:
-            survivor_foods = self.foods[:] # the foods still on the map
-            needed = config.FOOD_NR - len(survivor_foods) 
-            if needed > 0:
-                new_foods = self.world.spawn_food(needed, self.snakes, survivor_foods)
-                self.foods.extend(new_foods)
-                
-        if self.tick_count % config.SNAKE_GENERATION_INTERVAL == 0:
-            self.reset_simulation()
+            self.owed_ticks = 0.0
+            return 0
+        if elapsed is None:
+            elapsed = 1 / config.FPS
+        hurry = self.fast_forward or self.skip_until is not None
+        if hurry:
+            wanted = float("inf")
+        else:
+            self.owed_ticks += elapsed * config.TICKS_PER_SECOND * self.speed
+            wanted = int(self.owed_ticks)
+        budget = config.FRAME_SIM_BUDGET / config.FPS
+        start = time.perf_counter()
+        done = 0
+        while done < wanted and time.perf_counter() - start < budget:
+            if not self.advance(1):
+                break
+            done += 1
+            if self.skip_until is not None and self.generation >= self.skip_until:
+                self.skip_until = None
+                break
+        if not hurry:
+            self.owed_ticks = min(self.owed_ticks - done, 1.0)
+        return done
+
+
+    def status(self):
+        """Speed lines for the stats panel"""
+        if self.paused:
+            mode = "paused"
+        elif self.skip_until is not None:
+            mode = f"skipping to generation {self.skip_until}"
+        elif self.fast_forward:
+            mode = "fast-forward"
+        else:
+            mode = f"{self.speed}x"
+        return [f"Speed: {mode} ({self.ticks_per_second:.0f} ticks/sec)"]
+
+
+    def measure_rate(self, ticks, elapsed):
+        """Update ticks_per_second every half second"""
+        window = self.rate_window
+        window[0] += ticks
+        window[1] += elapsed
+        if window[1] >= 0.5:
+            self.ticks_per_second = window[0] / window[1]
+            self.rate_window = [0, 0.0]
 
 
     def run(self):
+        """Fixed-timestep loop: every frame simulates the ticks due since the last one and draws the latest state"""
         self.running = True
         print("Grid shape:", self.world.grid.shape)
+        last = time.perf_counter()
         while self.running:
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.start()
             self.handle_events()
-            self.update()
-            self.renderer.draw(self.snakes, self.foods, self.generation, self.tick_count, self.selected_entity)
+            if profiler is not None:
+                profiler.lap("events")
+            self.measure_rate(self.update(elapsed), elapsed)
+            profile = profiler.lines() if profiler is not None and self.show_profile else None
+            self.renderer.draw(
+                self.snakes, self.foods, self.generation, self.tick_count, self.selected_entity, profile, self.status()
+            )
+            if profiler is not None:
+                profiler.record("draw", self.renderer.draw_seconds)
             self.clock.tick(config.FPS)
         self.show_game_over_screen()
+        self.simulation.close()
         pygame.quit()
         
 
@@ -323,4 +207,38 @@ class GameController:
                     waiting = False
                 elif event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
                     waiting = False
-        
\ No newline at end of file
+        
+
+class ReplayController(GameController):
+    """Viewer for a recorded trace - same screen, but it seeks instead of simulating"""
+    SEEK_STEP = 100 # ticks skipped by the arrow keys
+
+    def __init__(self, replay, speed=1):
+        super().__init__(replay)
+        self.speed = speed
+
+
+    def handle_key(self, key):
+        """Right/left: seek SEEK_STEP ticks, N/B: next/previous generation"""
+        replay = self.simulation
+        if key in (pygame.K_RIGHT, pygame.K_LEFT, pygame.K_n, pygame.K_b):
+            if key == pygame.K_RIGHT:
+                replay.seek(replay.tick_count + self.SEEK_STEP)
+            elif key == pygame.K_LEFT:
+                replay.seek(replay.tick_count - self.SEEK_STEP)
+            elif key == pygame.K_n:
+                replay.seek_generation(replay.generation + 1)
+            else:
+                replay.seek_generation(replay.generation - 1)
+            self.selected_entity = None # the entities were rebuilt
+        else:
+            super().handle_key(key)
+
+
+    def advance(self, ticks):
+        """Replay up to ticks ticks, pause at the end of the trace instead of quitting"""
+        done = self.simulation.step(ticks)
+        if not self.simulation.running:
+            self.paused = True
+            self.skip_until = None
+        return done
@@ -0,0 +1,350 @@
+import random
+import numpy as np
+import core.config as default_config
+from core import genes, metrics
+from core.metrics import Profiler
+from entities.population import Population
+from entities.snake import Snake
+from simulation import checkpoint
+from simulation.history import HistoryWriter, STATS_SCHEMA
+from simulation.parallel import DecisionPool
+from simulation.trace import TraceRecorder
+from simulation.world import World
+
+DIRECTIONS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1)]) # spawn directions of new snakes
+
+STATS_COLUMNS = [name for name, _ in STATS_SCHEMA]
+
+
+class Simulation:
+    """Headless simulation core - owns the world, snakes and foods, no pygame involved"""
+    def __init__(self, seed=None, config=None, log_files=True):
+        if seed is not None:
+            random.seed(seed)
+        self.seed = seed
+        self.config = config if config is not None else default_config # module or core.config.Config
+        self.log_files = log_files # record every generation to the run history (stats.hist, genes.hist)
+        self.stats_history = [] # one row per finished generation, see STATS_COLUMNS
+        self.world = World(self.config)
+        self.running = True
+        self.generation = 0
+        self.tick_count = 0
+        self.population = Population(self.config) # struct-of-arrays store of the current generation
+        self.foods = self.world.foods # FoodIndex shared with the world
+        self.spawn_initial_snakes()
+        self.start_services()
+
+
+    @classmethod
+    def from_checkpoint(cls, path, log_files=True):
+        """Resume a simulation saved with save_checkpoint - it continues exactly like the saved one would"""
+        simulation = cls.__new__(cls)
+        checkpoint.restore(simulation, path)
+        simulation.log_files = log_files
+        simulation.start_services()
+        return simulation
+
+
+    def save_checkpoint(self, path=None):
+        """Write the full simulation state to path (config.CHECKPOINT_FILE by default)"""
+        checkpoint.save(self, path if path is not None else self.config.CHECKPOINT_FILE)
+
+
+    def start_services(self):
+        """Start the run history writer, the trace recorder, the profiler and the decision pool, if enabled"""
+        if not self.world.dense and self.config.PARALLEL_WORKERS > 0:
+            raise ValueError("PARALLEL_WORKERS needs whole-map arrays - at most CHUNKED_WORLD_TILES tiles")
+        self.history = None
+        if self.log_files:
+            self.history = HistoryWriter(
+                compress=self.config.HISTORY_COMPRESS, export_text=self.config.EXPORT_TEXT_LOGS,
+                chunk_generations=self.config.HISTORY_CHUNK_GENERATIONS
+            )
+        self.trace = None # per-tick event trace for replays, see simulation.trace
+        if self.config.TRACE_FILE:
+            self.trace = TraceRecorder(self.config.TRACE_FILE, self, self.config.TRACE_KEYFRAME_EVERY)
+        self.profiler = None # phase timings and search counters, exported to config.PROFILE_FILE
+        if self.config.PROFILE:
+            self.profiler = Profiler(self.config.PROFILE_FILE)
+            metrics.active = self.profiler # searches in this process count their work
+        self.decision_pool = None # path searches run on worker processes if config.PARALLEL_WORKERS > 0
+        if self.config.PARALLEL_WORKERS > 0:
+            self.decision_pool = DecisionPool(self.world, self.config.PARALLEL_WORKERS)
+
+
+    @property
+    def snakes(self):
+        """Snake views of the current generation, in spawn order"""
+        return self.population.snakes
+
+
+    def spawn_initial_snakes(self):
+        """Spawn config.SNAKE_COUNT snakes"""
+        chosen = self.world.sample_snake_starts(self.config.SNAKE_COUNT) # valid (position, direction) spawns
+        if not chosen: # should not happen, in most cases at least - IF it runs, tinker with core.config.py
+            raise ValueError("No valid spawn positions available in the world")
+
+        self.population = Population(self.config, capacity=len(chosen))
+        for pos, dir in chosen:
+            Snake(position=pos, direction=dir, color=random.choice(list(self.config.SNAKE_COLORS.values())),
+                  config=self.config, population=self.population)
+
+        self.world.reset_occupancy(self.snakes)
+        self.world.add_foods(self.world.spawn_food(self.config.FOOD_NR)) # call World's spawn_food method
+        print(f"Snakes after spawn: {len(self.snakes)}")
+        return self.snakes
+
+
+    def reset_simulation(self):
+        """Reset current world state and begin a new generation of snakes"""
+        population = self.population
+        fitnesses = population.fitness() # one vectorized pass, reused for logging, stats and selection
+        ranking = np.argsort(-fitnesses, kind="stable") # best first, ties keep spawn order
+
+        # --- STATISTICS FOR LATER USE ---
+        if not self.snakes:
+            self.running = False
+            return
+
+        n = population.size
+        energies = population.energy[:n]
+        stats_row = [
+            self.generation,
+            float(fitnesses.mean()),
+            float(fitnesses.max()),
+            float(fitnesses.min()),
+            float(np.median(fitnesses)),
+            float(energies.mean()),
+            len(np.unique(population.chr[:n])),
+            n
+        ]
+        self.stats_history.append(stats_row)
+        if self.history is not None: # written on the history thread, copies since the arrays live on
+            self.history.record(
+                self.generation, stats_row, population.chr[:n].copy(), fitnesses.copy(),
+                [self.snake_record(self.snakes[slot], fitnesses[slot]) for slot in ranking[:3].tolist()]
+            )
+
+        print(f"Alive snakes: {int(population.alive[:n].sum())}")
+        self.generation += 1
+        print(f"Generation {self.generation}")
+        self.population = self.evolve_snakes(fitnesses)
+        self.world.reset_occupancy(self.snakes)
+        if self.trace is not None:
+            self.trace.new_generation(self.snakes)
+
+        survivor_foods = list(self.foods)  # keep current foods
+        needed = self.config.FOOD_NR - len(survivor_foods)
+        if needed > 0:
+            new_foods = self.world.spawn_food(needed, survivor_foods)
+            self.world.add_foods(new_foods)
+            if self.trace is not None:
+                self.trace.foods_spawned(new_foods)
+
+
+    def snake_record(self, snake, fitness):
+        """Plain values describing a snake for the snake_log.txt exporter"""
+        return {
+            "chr": snake.chr, "algorithm": snake.algorithm.__name__, "fitness": float(fitness),
+            "vision_range": snake.vision_range, "exploration": snake.exploration,
+            "max_energy": snake.max_energy, "timidity": snake.timidity,
+            "toxic_reaction": snake.toxic_reaction, "toxic_resistance": snake.toxic_resistance,
+            "food_preference": snake.food_preference,
+        }
+
+
+    def evolve_snakes(self, fitnesses):
+        """Evolve survivor snakes and return the population of the new generation"""
+        num_snakes = len(self.snakes)
+        if num_snakes < 2:
+            self.running = False
+            return Population(self.config)
+
+        def get_selected_count(survived_nr):
+            if survived_nr in range(2, 5):
+                return 2
+            elif survived_nr in range(6, 17):
+                return 3
+            else:
+                return survived_nr//5 # 20%
+
+        selected_count = get_selected_count(num_snakes)
+        print(f"{min(selected_count, num_snakes)} snakes survived. Yay!")
+
+        # Create offspring from survivors - crossover, mutation and spawn sampling for all children at once
+        rng = self.world.rng
+        count = self.config.SNAKE_COUNT + int(rng.integers(-1, 2)) * self.config.SNAKE_COUNT//4 # chance to spawn more or less snakes for each generation
+        population = self.population
+        chromosomes = genes.breed(population.chr[:population.size], fitnesses, selected_count, count, rng)
+        positions = self.world.random_passable(count, rng)
+        directions = DIRECTIONS[rng.integers(0, len(DIRECTIONS), count)]
+        colors = list(self.config.SNAKE_COLORS.values())
+        colors = [colors[i] for i in rng.integers(0, len(colors), count).tolist()]
+
+        new_population = Population(self.config, capacity=count)
+        Snake.spawn_batch(new_population, chromosomes, positions, directions, colors, self.config)
+        return new_population
+
+
+    def update(self):
+        """Update simulation state by one tick"""
+        self.tick_count += 1
+
+        if not self.snakes:
+            self.running = False
+            return
+
+        profiler = self.profiler # per-phase laps, see core.metrics - a None check is all it costs when off
+        if profiler is not None:
+            profiler.start()
+
+        # Decide movements for all snakes - obstacle halos are dilated once per tick for every timidity
+        self.world.update_halos(s.timidity for s in self.snakes if s.alive)
+        if profiler is not None:
+            profiler.lap("halos")
+        planning = [] # (snake, PlanJob) pairs for the decision pool
+        for snake in self.snakes:
+            if not snake.alive:
+                continue
+            halo = self.world.halo_obstacles(snake)
+            if self.decision_pool is None:
+                snake.decide_movement(self.world.grid, self.foods, halo)
+                continue
+            job = snake.plan_job(self.foods, halo)
+            if job is not None:
+                planning.append((snake, job))
+        if planning: # searches only read the world, so they run in parallel and return paths only
+            paths = self.decision_pool.plan([job for _, job in planning], profiler)
+            for (snake, _), path in zip(planning, paths):
+                snake.apply_plan(path)
+        if profiler is not None:
+            profiler.lap("decide")
+
+        trace = self.trace
+        moved = []
+        for snake in self.snakes: # snakes keep world.occupancy up to date as they move
+            if snake.alive and snake.move(self.world):
+                moved.append(snake.slot)
+        if trace is not None:
+            trace.moved(self.snakes)
+        if profiler is not None:
+            profiler.lap("move")
+        # energy drain, shrinking and energy/length deaths as vectorized passes over the population
+        moved = self.population.spend_energy(self.world, moved)
+        if trace is not None:
+            trace.spent_energy(self.snakes)
+        if profiler is not None:
+            profiler.lap("energy")
+
+        for slot in moved.tolist():
+            snake = self.snakes[slot]
+            food = self.foods.first_at(snake.position)
+            if food is not None: # snake ate some food
+                if food.toxic == False:
+                    snake.grow()
+                    snake.energy += self.config.FOOD_ENERGY
+                    snake.energy = min(snake.energy, snake.max_energy)
+                else:
+                    penalty = food.energy_factor * self.config.FOOD_ENERGY * snake.toxic_resistance
+                    snake.energy -= penalty
+                    snake.energy_since_last_shrink += penalty
+                    snake.score += 3
+                if trace is not None:
+                    trace.ate(slot, food)
+                self.world.remove_food(food)
+        if profiler is not None:
+            profiler.lap("eat")
+
+        for food in self.foods:
+            old_position = food.position
+            food.move(self.world.grid, self.world.occupancy)
+            if food.position != old_position:
+                self.world.relocate_food(food, old_position)
+                if trace is not None:
+                    trace.food_moved(food, old_position)
+        if profiler is not None:
+            profiler.lap("food_move")
+
+        for snake in self.snakes:
+            if not snake.alive:
+                self.world.remove_snake(snake)
+        self.population.cull() # remove dead snakes
+        if profiler is not None:
+            profiler.lap("cull")
+
+        # Check for extinction
+        if not self.snakes:
+            self.running = False
+            if trace is not None:
+                trace.end_tick(self)
+            if profiler is not None: # the last tick counts too - close() exports it
+                profiler.end_tick()
+            return
+
+        # food respawn
+        if self.tick_count % self.config.FOOD_RESPAWN_RATE == 0:
+            survivor_foods = list(self.foods) # the foods still on the map
+            needed = self.config.FOOD_NR - len(survivor_foods)
+            if needed > 0:
+                new_foods = self.world.spawn_food(needed, survivor_foods)
+                self.world.add_foods(new_foods)
+                if trace is not None:
+                    trace.foods_spawned(new_foods)
+            if profiler is not None:
+                profiler.lap("respawn")
+
+        if self.tick_count % self.config.SNAKE_GENERATION_INTERVAL == 0:
+            self.reset_simulation()
+            if profiler is not None:
+                profiler.lap("generation")
+            every = self.config.CHECKPOINT_EVERY
+            if every and self.running and self.generation % every == 0:
+                self.save_checkpoint()
+                if profiler is not None:
+                    profiler.lap("checkpoint")
+        if trace is not None:
+            trace.end_tick(self)
+        if profiler is not None:
+            profiler.end_tick()
+            if self.tick_count % self.config.PROFILE_EVERY == 0:
+                profiler.export(tick=self.tick_count, generation=self.generation, snakes=len(self.snakes))
+
+
+    def close(self):
+        """Release the decision pool's worker processes and shared memory, flush the run history, trace and profile"""
+        if self.decision_pool is not None:
+            self.decision_pool.close(self.world)
+            self.decision_pool = None
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+        if self.profiler is not None:
+            self.profiler.export(tick=self.tick_count, generation=self.generation, snakes=len(self.snakes))
+            if metrics.active is self.profiler:
+                metrics.active = None
+            self.profiler = None
+
+
+    def step(self, n=1):
+        """Advance the simulation by up to n ticks, return the number of ticks run"""
+        done = 0
+        while done < n and self.running:
+            self.update()
+            done += 1
+        return done
+
+
+    def run_until(self, generation=None, tick=None):
+        """Run with no FPS cap until the given generation/tick is reached or all snakes die"""
+        if generation is None and tick is None:
+            raise ValueError("run_until needs a generation or a tick to stop at")
+        while self.running:
+            if generation is not None and self.generation >= generation:
+                break
+            if tick is not None and self.tick_count >= tick:
+                break
+            self.update()
+        return self.running
@@ -0,0 +1,197 @@
+import atexit
+import csv
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+MAGIC = b"SNAKEHIST1\n"
+HEADER_SIZE = struct.Struct("<I")   # length of the JSON schema after the magic
+CHUNK_HEADER = struct.Struct("<IIB") # rows, payload bytes, zlib compressed
+
+# per-generation stats, same columns as stats.csv
+STATS_SCHEMA = [
+    ("generation", "<i8"), ("avg_fitness", "<f8"), ("max_fitness", "<f8"), ("min_fitness", "<f8"),
+    ("median_fitness", "<f8"), ("avg_energy", "<f8"), ("unique_chromosomes", "<i8"), ("num_snakes", "<i8"),
+]
+# one row per snake and generation, same columns as genes.csv
+GENES_SCHEMA = [("generation", "<i4"), ("chromosome", "<i4"), ("fitness", "<f8")]
+
+
+class ColumnarFile:
+    """Appendable binary column store: magic, JSON schema, then chunks holding every column of some rows"""
+    def __init__(self, path, schema, compress=True):
+        self.path = path
+        self.schema = [(name, np.dtype(dtype)) for name, dtype in schema]
+        self.compress = compress
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            existing = read_schema(path)
+            if [(name, dtype.str) for name, dtype in existing] != [(name, dtype.str) for name, dtype in self.schema]:
+                raise ValueError(f"{path} holds a history with different columns")
+        else:
+            header = json.dumps([[name, dtype.str] for name, dtype in self.schema]).encode()
+            with open(path, "wb") as f:
+                f.write(MAGIC + HEADER_SIZE.pack(len(header)) + header)
+
+
+    def append(self, columns):
+        """Write one chunk from a dict of equally long column arrays"""
+        rows = len(columns[self.schema[0][0]])
+        if rows == 0:
+            return
+        payload = b"".join(np.ascontiguousarray(columns[name], dtype=dtype).tobytes() for name, dtype in self.schema)
+        if self.compress:
+            payload = zlib.compress(payload, 6)
+        with open(self.path, "ab") as f:
+            f.write(CHUNK_HEADER.pack(rows, len(payload), self.compress) + payload)
+
+
+def read_schema(path):
+    """Column names and dtypes of a ColumnarFile"""
+    with open(path, "rb") as f:
+        data = f.read(len(MAGIC) + HEADER_SIZE.size)
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a run history file")
+        (size,) = HEADER_SIZE.unpack_from(data, len(MAGIC))
+        return [(name, np.dtype(dtype)) for name, dtype in json.loads(f.read(size))]
+
+
+def read_history(path):
+    """Load a ColumnarFile as a dict of numpy columns - e.g. pandas.DataFrame(read_history("stats.hist"))"""
+    schema = read_schema(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    (size,) = HEADER_SIZE.unpack_from(data, len(MAGIC))
+    offset = len(MAGIC) + HEADER_SIZE.size + size
+    chunks = {name: [] for name, _ in schema}
+    while offset + CHUNK_HEADER.size <= len(data):
+        rows, length, compressed = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        if offset + length > len(data): # chunk cut off by a crash - ignore it
+            break
+        payload = data[offset:offset + length]
+        offset += length
+        if compressed:
+            payload = zlib.decompress(payload)
+        start = 0
+        for name, dtype in schema:
+            chunks[name].append(np.frombuffer(payload, dtype=dtype, count=rows, offset=start))
+            start += rows * dtype.itemsize
+    return {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.zeros(0, dtype=dtype)
+        for name, dtype in schema
+    }
+
+
+class TextExporter:
+    """The plain text outputs: snake_log.txt, stats.csv and genes.csv"""
+    def __init__(self, directory="."):
+        self.directory = directory
+
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+    def write(self, record):
+        generation = record["generation"]
+        with open(self.path("snake_log.txt"), "a") as f: # generation data logging
+            f.write(f"\nGeneration {generation} top 3:\n\n")
+            for i, snake in enumerate(record["top_snakes"], 1):
+                chr_bin = format(snake["chr"], '020b')
+                f.write(
+                    f"#{i} Chr: {chr_bin}\nAlgorithm: {snake['algorithm']}\n"
+                )
+                f.write(
+                    f"Fitness: {snake['fitness']}"
+                )
+                f.write(
+                    f"\nVision Ramge: {snake['vision_range']} tiles\nExploration: {snake['exploration']}"
+                )
+                f.write(
+                    f"\nMax Energy: {snake['max_energy']}\nTimidity: {snake['timidity']}"
+                )
+                f.write(
+                    f"Toxic Reaction: {snake['toxic_reaction']}\nToxic Penalty Scale: {snake['toxic_resistance']}"
+                )
+                f.write(
+                    f"Food preference: {snake['food_preference']}\n\n"
+                )
+
+        with open(self.path("stats.csv"), "a", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            if csvfile.tell() == 0:
+                writer.writerow([name for name, _ in STATS_SCHEMA])
+            writer.writerow(record["stats"])
+
+        with open(self.path("genes.csv"), "a", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            if csvfile.tell() == 0:
+                writer.writerow([name for name, _ in GENES_SCHEMA])
+            n = len(record["chromosomes"])
+            writer.writerows(zip([generation] * n, record["chromosomes"].tolist(), record["fitnesses"].tolist()))
+
+
+class HistoryWriter:
+    """Run history sink - the simulation hands over generation records, a background thread buffers and writes them"""
+    def __init__(self, directory=".", compress=True, export_text=False, chunk_generations=32):
+        self.stats_file = ColumnarFile(os.path.join(directory, "stats.hist"), STATS_SCHEMA, compress)
+        self.genes_file = ColumnarFile(os.path.join(directory, "genes.hist"), GENES_SCHEMA, compress)
+        self.exporter = TextExporter(directory) if export_text else None
+        self.chunk_generations = chunk_generations
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="history-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close) # flush what is buffered if the owner never closes us
+
+
+    def record(self, generation, stats, chromosomes, fitnesses, top_snakes):
+        """Queue one generation - returns immediately, arrays must not be modified afterwards"""
+        self.queue.put({
+            "generation": generation, "stats": stats, "chromosomes": chromosomes,
+            "fitnesses": fitnesses, "top_snakes": top_snakes,
+        })
+
+
+    def run(self):
+        """Writer thread: buffer records and append them as one chunk per chunk_generations generations"""
+        buffered = []
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            buffered.append(record)
+            if self.exporter is not None:
+                self.exporter.write(record)
+            if len(buffered) >= self.chunk_generations:
+                self.write_chunk(buffered)
+                buffered = []
+        self.write_chunk(buffered)
+
+
+    def write_chunk(self, records):
+        if not records:
+            return
+        stats = list(zip(*(record["stats"] for record in records)))
+        self.stats_file.append({name: stats[i] for i, (name, _) in enumerate(STATS_SCHEMA)})
+        self.genes_file.append({
+            "generation": np.concatenate([
+                np.full(len(record["chromosomes"]), record["generation"]) for record in records
+            ]),
+            "chromosome": np.concatenate([record["chromosomes"] for record in records]),
+            "fitness": np.concatenate([record["fitnesses"] for record in records]),
+        })
+
+
+    def close(self):
+        """Write everything still buffered and stop the thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        atexit.unregister(self.close)
@@ -0,0 +1,101 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from core import genes, metrics
+from entities.snake import plan_path
+from simulation.world import Halo
+
+TIMIDITIES = sorted(set(genes.DECODER["timidity"].values())) # one shared halo count layer per value
+
+# worker side: numpy views of the shared blocks, attached once per process
+_blocks = []
+_arrays = {}
+
+
+def _attach(specs):
+    """Worker initializer: map the world's shared memory blocks into numpy arrays"""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block) # the views are only valid while the block stays open
+        _arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class SearchLog(list):
+    """Stands in for the profiler in a worker: keeps the count_search calls to be replayed in the main process"""
+    def count_search(self, algorithm, expanded, pushed, path):
+        self.append((algorithm, expanded, pushed, path))
+
+
+def _plan(job, profile):
+    """Worker task: search one snake's path against the published world, return the path and the searches' counters"""
+    grid = _arrays["grid"]
+    halo = Halo(
+        _arrays["halos"][TIMIDITIES.index(job.timidity)], _arrays["occupancy"], job.snake_id,
+        job.body, job.position, job.vision_range, job.timidity
+    )
+    searches = metrics.active = SearchLog() if profile else None
+    return plan_path(grid, job, halo), searches
+
+
+class DecisionPool:
+    """Runs the snakes' path searches on worker processes that read the world from shared memory"""
+    def __init__(self, world, workers):
+        self.workers = workers
+        shape = world.grid.shape
+        self.blocks = {}
+        self.arrays = {}
+        self.share("grid", shape, world.grid.dtype)[:] = world.grid # terrain is static, copied once
+        # the world keeps writing its occupancy straight into shared memory - nothing to copy per tick
+        occupancy = self.share("occupancy", shape, world.occupancy.dtype)
+        occupancy[:] = world.occupancy
+        world.occupancy = occupancy
+        # and its halo counts too: update_halos writes each timidity's layer into the shared block
+        halos = self.share("halos", (len(TIMIDITIES),) + shape, np.int64)
+        world.halo_buffers = {t: halos[i] for i, t in enumerate(TIMIDITIES)}
+
+        specs = {
+            name: (block.name, self.arrays[name].shape, self.arrays[name].dtype.str)
+            for name, block in self.blocks.items()
+        }
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,))
+
+
+    def share(self, name, shape, dtype):
+        """Allocate a named shared memory block and return a numpy view of it"""
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+
+    def plan(self, jobs, profiler=None):
+        """Search every job in parallel against the shared world, return the paths.
+
+        The workers' search counters go to profiler, if there is one.
+        """
+        if not jobs:
+            return []
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        results = list(self.executor.map(
+            _plan, jobs, itertools.repeat(profiler is not None), chunksize=chunksize
+        ))
+        if profiler is not None:
+            for _, searches in results:
+                for search in searches:
+                    profiler.count_search(*search)
+        return [path for path, _ in results]
+
+
+    def close(self, world):
+        """Stop the workers and free the shared memory - the world gets private occupancy and halo copies back"""
+        self.executor.shutdown()
+        world.occupancy = self.arrays["occupancy"].copy()
+        world.halos = {t: counts.copy() for t, counts in world.halos.items()}
+        world.halo_buffers = {}
+        self.arrays.clear()
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
@@ -1,8 +1,7 @@
+import time
 import pygame
 import numpy as np
 import core.config as config
-from entities.snake import Snake
-from simulation.world import World
 
 colors = [
     (255, 0, 0),      # red
@@ -17,6 +16,94 @@ colors = [
     (255, 0, 128),    # pink
 ]
 
+ZOOM_LEVELS = [1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 24, 32, 40] # pixels per tile the camera can zoom to
+
+
+class Camera:
+    """The part of the world the map area shows: top left tile and zoom (pixels per tile), whole tiles only"""
+    def __init__(self, world_shape, width, height, tile_size):
+        self.rows, self.cols = world_shape
+        self.width, self.height = width, height # map area in pixels
+        self.tile_size = tile_size
+        self.x, self.y = 0, 0 # top left tile in view (x = row, y = col)
+        self.drag = [0, 0]    # pixels dragged that did not add up to a whole tile yet
+
+
+    @property
+    def view_rows(self):
+        return min(self.rows, -(-self.height // self.tile_size))
+
+
+    @property
+    def view_cols(self):
+        return min(self.cols, -(-self.width // self.tile_size))
+
+
+    def visible(self):
+        """Tiles in view as (x0, x1, y0, y1): rows x0:x1 and cols y0:y1, the last ones possibly cut by the edge"""
+        return self.x, self.x + self.view_rows, self.y, self.y + self.view_cols
+
+
+    def rect(self):
+        """Screen area the map covers - smaller than the map area when the world does not fill it"""
+        return pygame.Rect(
+            0, 0, min(self.width, self.view_cols * self.tile_size), min(self.height, self.view_rows * self.tile_size)
+        )
+
+
+    def tile_rect(self, tile):
+        """Screen rectangle of a grid tile (x = row, y = col)"""
+        size = self.tile_size
+        return pygame.Rect((tile[1] - self.y) * size, (tile[0] - self.x) * size, size, size)
+
+
+    def tile_center(self, tile):
+        size = self.tile_size
+        return (tile[1] - self.y) * size + size // 2, (tile[0] - self.x) * size + size // 2
+
+
+    def tile_at(self, px, py):
+        """Grid tile under a screen pixel of the map area"""
+        return self.x + py // self.tile_size, self.y + px // self.tile_size
+
+
+    def move_to(self, x, y):
+        """Put tile (x, y) in the top left corner, as far as the world reaches"""
+        self.x = max(0, min(x, self.rows - self.view_rows))
+        self.y = max(0, min(y, self.cols - self.view_cols))
+
+
+    def pan(self, dx, dy):
+        self.move_to(self.x + dx, self.y + dy)
+
+
+    def pan_pixels(self, dx, dy):
+        """Follow a mouse drag of (dx, dy) screen pixels"""
+        self.drag[0] -= dy
+        self.drag[1] -= dx
+        tiles = [int(d / self.tile_size) for d in self.drag] # whole tiles, towards zero
+        self.drag = [d - t * self.tile_size for d, t in zip(self.drag, tiles)]
+        self.pan(*tiles)
+
+
+    def center_on(self, tile):
+        self.move_to(tile[0] - self.view_rows // 2, tile[1] - self.view_cols // 2)
+
+
+    def zoom(self, steps, anchor=None):
+        """Zoom in (steps > 0) or out by ZOOM_LEVELS steps, keeping the tile under the anchor pixel in place"""
+        levels = ZOOM_LEVELS
+        current = min(range(len(levels)), key=lambda i: abs(levels[i] - self.tile_size))
+        size = levels[max(0, min(current + steps, len(levels) - 1))]
+        if size == self.tile_size:
+            return
+        px, py = anchor if anchor is not None else (self.width // 2, self.height // 2)
+        x, y = self.tile_at(px, py)
+        self.tile_size = size
+        self.drag = [0, 0]
+        self.move_to(x - py // size, y - px // size)
+
+
 class Renderer:
     """Controls game graphics"""
     def __init__(self, world):
@@ -26,74 +113,135 @@ class Renderer:
         pygame.display.set_caption(f"Snake Genetics Simulation")
         self.font_small = pygame.font.SysFont("Arial", 16)
         self.font_large = pygame.font.SysFont("Arial", 24)
-        self.clock = pygame.time.Clock()
-        
-        
-    def draw_terrain(self):
-        """Draww world map"""
-        for x in range(self.world.grid.shape[0]):
-            for y in range(self.world.grid.shape[1]):
-                terrain_type = self.world.grid[x][y]
-                color = config.LAND_COLORS.get(terrain_type, (0, 0, 0))
-                pygame.draw.rect(
-                    self.screen, color,
-                    (y * config.TILE_SIZE, x * config.TILE_SIZE, 
-                    config.TILE_SIZE, config.TILE_SIZE)
-                )
-
-
-    def draw_snakes(self, snakes):
-        """Draw snake entities"""
-        if snakes is None:
-            snakes = []
-        for snake in snakes:
-            if not snake.alive:
-                continue
-            for i, segment in enumerate(snake.body):
-                pygame.draw.rect(
-                    self.screen, snake.color,
-                    (segment[1] * config.TILE_SIZE, segment[0] * config.TILE_SIZE,  
-                    config.TILE_SIZE, config.TILE_SIZE)
-                )
-
-
-    def draw_food(self, foods):
-        """Draw food entities"""
-        for food in foods:
-            # Decide color based on toxicity and energy factor
-            if food.energy_factor == 0.5:
-                color = config.FOOD_COLORS["low"]
-            elif food.energy_factor == 1.0:
-                color = config.FOOD_COLORS["med"]
-            else:
-                color = config.FOOD_COLORS["high"]
-
-            rect = pygame.Rect(
-                food.position[1] * config.TILE_SIZE,
-                food.position[0] * config.TILE_SIZE,
-                config.TILE_SIZE,
-                config.TILE_SIZE
-            )
-
-            pygame.draw.rect(self.screen, color, rect)
-
-            if food.toxic:
-                pygame.draw.line(self.screen, (255, 0, 0), rect.topleft, rect.bottomright, 2)
-                pygame.draw.line(self.screen, (255, 0, 0), rect.topright, rect.bottomleft, 2)
+        # the world can be larger or smaller than the window - the camera picks the tiles the map shows
+        self.camera = Camera(world.grid.shape, config.WINDOW_WIDTH, config.WINDOW_HEIGHT, config.TILE_SIZE)
+        self.terrain_view = None    # camera position and zoom the terrain surface was rendered for
+        self.terrain_surface = None
+        self.snakes_by_id = {}      # snake id -> snake, for the ids found on the occupancy grid
+        self.drawn_tiles = {}   # tile -> what was drawn on it during the last frame
+        self.drawn_path = []    # tiles covered by the selected snake's path overlay
+        self.full_redraw = True
+        self.draw_seconds = 0.0 # time the last frame took to draw
+
+
+    @property
+    def map_rect(self):
+        return self.camera.rect()
+
+
+    def build_terrain_surface(self):
+        """Pre-render the static terrain in view into an off-screen surface"""
+        terrain_types = np.array(sorted(config.LAND_COLORS))
+        palette = np.array([config.LAND_COLORS[t] for t in terrain_types] + [(0, 0, 0)], dtype=np.uint8)
+        grid = self.world.terrain.costs(*self.camera.visible()) # only the chunks in view are generated
+        idx = np.searchsorted(terrain_types, grid)
+        idx[(idx >= len(terrain_types)) | (terrain_types[np.minimum(idx, len(terrain_types) - 1)] != grid)] = len(terrain_types) # unknown terrain => black
+        pixels = palette[idx].transpose(1, 0, 2) # surfarray is indexed (screen x, screen y) = (col, row)
+        small = pygame.surfarray.make_surface(pixels)
+        size = self.camera.tile_size
+        return pygame.transform.scale(small, (grid.shape[1] * size, grid.shape[0] * size))
+
+
+    def update_view(self):
+        """Re-render the terrain and redraw everything once the camera moved or zoomed"""
+        view = (self.camera.visible(), self.camera.tile_size)
+        if view != self.terrain_view:
+            self.terrain_surface = self.build_terrain_surface()
+            self.terrain_view = view
+            self.full_redraw = True
+
+
+    def tile_rect(self, tile):
+        """Screen rectangle of a grid tile (x = row, y = col)"""
+        return self.camera.tile_rect(tile)
+
+
+    def draw_terrain(self, rect=None):
+        """Draw world map (or just one area of it) from the cached terrain layer"""
+        if rect is None:
+            self.screen.blit(self.terrain_surface, (0, 0))
+        else:
+            self.screen.blit(self.terrain_surface, rect, rect)
+
+
+    def visible_snakes(self, snakes):
+        """(tile, snake) of every living snake segment in view, from the occupancy grid rather than the bodies"""
+        tiles, ids = self.world.occupied_in(*self.camera.visible())
+        ids = ids.tolist()
+        known = self.snakes_by_id
+        if any(snake_id not in known for snake_id in ids): # new snakes - ids never come back, dead ones map to None
+            known = self.snakes_by_id = {s.id: s for s in snakes or []}
+            for snake_id in ids:
+                known.setdefault(snake_id, None)
+        return [
+            (tile, known[snake_id]) for tile, snake_id in zip(map(tuple, tiles.tolist()), ids)
+            if known[snake_id] is not None and known[snake_id].alive
+        ]
+
+
+    def visible_foods(self, foods):
+        """Foods in view, from the food index buckets"""
+        return foods.in_rect(*self.camera.visible())
+
+
+    def draw_food_tile(self, rect, energy_factor, toxic):
+        """Draw a single food tile"""
+        # Decide color based on toxicity and energy factor
+        if energy_factor == 0.5:
+            color = config.FOOD_COLORS["low"]
+        elif energy_factor == 1.0:
+            color = config.FOOD_COLORS["med"]
+        else:
+            color = config.FOOD_COLORS["high"]
+
+        pygame.draw.rect(self.screen, color, rect)
+
+        if toxic:
+            pygame.draw.line(self.screen, (255, 0, 0), rect.topleft, rect.bottomright, 2)
+            pygame.draw.line(self.screen, (255, 0, 0), rect.topright, rect.bottomleft, 2)
             
             
     def draw_snake_path(self, snake):
         """Draw current path for a selected snake"""
         if not hasattr(snake, "path") or not snake.path:
             return
-        points = [(y * config.TILE_SIZE + config.TILE_SIZE // 2,
-                x * config.TILE_SIZE + config.TILE_SIZE // 2)
-                for x, y in snake.path]
+        points = [self.camera.tile_center(tile) for tile in snake.path]
         if len(points) > 1:
+            self.screen.set_clip(self.map_rect) # paths running out of view stay off the stats panel
             pygame.draw.lines(self.screen, (255, 255, 0), False, points, 3)
+            self.screen.set_clip(None)
 
         
-    def draw_stats(self, snakes, foods, generation, tick, selected_entity):
+    @staticmethod
+    def population_of(snakes):
+        """The Population the snakes are views of, None for other snakes (e.g. a replay's)"""
+        population = getattr(snakes[0], "population", None) if snakes else None
+        return population if population is not None and population.snakes is snakes else None
+
+
+    def alive_count(self, snakes):
+        population = self.population_of(snakes)
+        if population is not None:
+            return int(population.alive[:population.size].sum())
+        return sum(1 for s in snakes if s.alive)
+
+
+    def top_snakes(self, snakes, count):
+        """The count fittest snakes, first in spawn order on ties - ranked on the population's columns if there is one"""
+        population = self.population_of(snakes)
+        if population is not None:
+            order = np.argsort(-population.fitness(), kind="stable")[:count]
+            return [snakes[slot] for slot in order.tolist()]
+        return sorted(
+            snakes,
+            key=lambda s: (config.LENGTH_WEIGHT * len(s.body) + 
+                           config.SCORE_WEIGHT * s.score + 
+                           config.ENERGY_WEIGHT * (s.energy//100)),
+            reverse=True
+        )[:count]
+
+
+    def draw_stats(self, snakes, foods, generation, tick, selected_entity, profile=None, status=None):
         """Render current world stats"""
         
         if not snakes:
@@ -113,9 +261,10 @@ class Renderer:
         stats = [
             f"Current tick: {tick}",
             f"Generation: {generation}",
-            f"Alive snakes: {sum(1 for s in snakes if s.alive)}",
+            *(status or []), # simulation speed, from the controller
+            f"Alive snakes: {self.alive_count(snakes)}",
             f"Total food: {len(foods)}",
-            f"Toxic food: {sum(1 for f in foods if getattr(f, 'toxic', False))}",
+            f"Toxic food: {foods.toxic_count}",
             "---------------------",
             "Top 5 Snakes:"
         ]
@@ -125,13 +274,7 @@ class Renderer:
             self.screen.blit(text, (x_offset, y))
             y += 18
 
-        top_snakes = sorted(
-            snakes,
-            key=lambda s: (config.LENGTH_WEIGHT * len(s.body) + 
-                           config.SCORE_WEIGHT * s.score + 
-                           config.ENERGY_WEIGHT * (s.energy//100)),
-            reverse=True
-        )[:5]
+        top_snakes = self.top_snakes(snakes, 5)
 
         if not top_snakes:
             stats.append("No snakes to show!")
@@ -179,32 +322,14 @@ class Renderer:
                 self.screen.blit(self.font_small.render(f"Energy Factor: {getattr(selected_entity, 'energy_factor', '?')}", True, (255,255,255)), (x_offset, y)); y += 18
                 self.screen.blit(self.font_small.render(f"Toxic: {getattr(selected_entity, 'toxic', '?')}", True, (255,255,255)), (x_offset, y)); y += 18
                 self.screen.blit(self.font_small.render(f"Genes: {format(getattr(selected_entity, 'chromosome', 0), '05b')}", True, (0,255,0)), (x_offset, y)); y += 18
+
+        if profile: # profiler summary lines, see core.metrics.Profiler.lines
+            y += 20
+            self.screen.blit(self.font_large.render("Profile:", True, (0,255,255)), (x_offset, y))
+            y += 28
+            for line in profile:
+                self.screen.blit(self.font_small.render(line, True, (255,255,255)), (x_offset, y)); y += 18
     
-    def draw_selected_entity_contour(self, selected_entity):
-        """Draw a yellow contour around the selected entity."""
-        if selected_entity is None:
-            return
-        contour_color = (255, 255, 0)  # Yellow
-
-        if hasattr(selected_entity, "body"):  # Snake
-            for segment in selected_entity.body:
-                rect = pygame.Rect(
-                    segment[1] * config.TILE_SIZE,
-                    segment[0] * config.TILE_SIZE,
-                    config.TILE_SIZE,
-                    config.TILE_SIZE
-                )
-                pygame.draw.rect(self.screen, contour_color, rect, 1)
-        elif hasattr(selected_entity, "position"):  # Food
-            pos = selected_entity.position
-            rect = pygame.Rect(
-                pos[1] * config.TILE_SIZE,
-                pos[0] * config.TILE_SIZE,
-                config.TILE_SIZE,
-                config.TILE_SIZE
-            )
-            pygame.draw.rect(self.screen, contour_color, rect, 3)
-            
     def show_game_over_screen(self, message="SIMULATION OVER"):
         font = pygame.font.SysFont("Arial", 48)
         text = font.render(message, True, (255, 0, 0))
@@ -218,13 +343,82 @@ class Renderer:
         pygame.display.flip()
         
             
-    def draw(self, snakes, foods, generation, tick, selected_entity):
+    def in_view(self, tiles):
+        """The tiles the camera sees, of a few (a selected snake or path) - culling many goes through the indexes"""
+        x0, x1, y0, y1 = self.camera.visible()
+        return [tile for tile in tiles if x0 <= tile[0] < x1 and y0 <= tile[1] < y1]
+
+
+    def collect_tiles(self, snakes, foods, selected_entity):
+        """Map every tile in view covered by an entity to what should be drawn on it"""
+        tiles = {}
+        for food in self.visible_foods(foods):
+            tiles[food.position] = ("food", food.energy_factor, food.toxic)
+        for tile, snake in self.visible_snakes(snakes):
+            tiles[tile] = ("snake", snake.color)
+        if selected_entity is not None: # contour is part of the tile's look
+            cells = selected_entity.body if hasattr(selected_entity, "body") else [selected_entity.position]
+            for cell in self.in_view(cells):
+                if cell in tiles:
+                    tiles[cell] = tiles[cell] + ("selected",)
+        return tiles
+
+
+    def draw_tile(self, tile, look):
+        """Redraw one tile: terrain first, then whatever entity is on it"""
+        rect = self.tile_rect(tile)
+        # keep toxic crosses from bleeding into tiles that are not redrawn, and tiles cut by the view's edge off the stats panel
+        self.screen.set_clip(rect.clip(self.map_rect))
+        self.draw_terrain(rect)
+        if look is None:
+            self.screen.set_clip(None)
+            return
+        if look[0] == "food":
+            self.draw_food_tile(rect, look[1], look[2])
+            if look[-1] == "selected":
+                pygame.draw.rect(self.screen, (255, 255, 0), rect, 3)
+        else:
+            pygame.draw.rect(self.screen, look[1], rect)
+            if look[-1] == "selected":
+                pygame.draw.rect(self.screen, (255, 255, 0), rect, 1)
+        self.screen.set_clip(None)
+
+
+    def draw(self, snakes, foods, generation, tick, selected_entity, profile=None, status=None):
         """General function that combines all other Renderer class methods"""
-        self.screen.fill((0, 0, 0))
-        self.draw_terrain()
-        self.draw_food(foods)
-        self.draw_snakes(snakes)
-        self.draw_selected_entity_contour(selected_entity)
-        self.draw_stats(snakes, foods, generation, tick, selected_entity)
-        pygame.display.flip()
-        self.clock.tick(config.FPS)
\ No newline at end of file
+        start = time.perf_counter()
+        self.update_view()
+        tiles = self.collect_tiles(snakes, foods, selected_entity)
+        path = self.in_view(selected_entity.path) if getattr(selected_entity, "path", None) else []
+        stats_rect = pygame.Rect(config.WINDOW_WIDTH, 0, config.STATS_WIDTH, config.WINDOW_HEIGHT)
+
+        if self.full_redraw:
+            self.screen.fill((0, 0, 0))
+            self.screen.set_clip(self.map_rect) # tiles cut by the edge of the view stay off the stats panel
+            self.draw_terrain()
+            self.screen.set_clip(None)
+            for tile, look in tiles.items():
+                self.draw_tile(tile, look)
+            dirty = None
+            self.full_redraw = False
+        else:
+            # only tiles whose content changed since the last frame, plus the old and new path overlay
+            changed = {t for t, look in tiles.items() if self.drawn_tiles.get(t) != look}
+            changed.update(t for t in self.drawn_tiles if t not in tiles)
+            changed.update(self.drawn_path)
+            changed.update(path)
+            for tile in changed:
+                self.draw_tile(tile, tiles.get(tile))
+            dirty = [self.tile_rect(t).clip(self.map_rect) for t in changed]
+            self.screen.fill((0, 0, 0), stats_rect)
+            dirty.append(stats_rect)
+
+        self.draw_stats(snakes, foods, generation, tick, selected_entity, profile, status) # also draws the selected snake's path
+        self.drawn_tiles = tiles
+        self.drawn_path = path
+
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+        self.draw_seconds = time.perf_counter() - start
\ No newline at end of file
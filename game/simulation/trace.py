@@ -0,0 +1,475 @@
+import atexit
+import bisect
+import itertools
+import json
+import os
+import struct
+import zlib
+from collections import deque
+import numpy as np
+from core import genes
+from core.spatial import ChunkGrid, FoodIndex
+from entities.food import Food
+from simulation.world import EMPTY, Terrain, cover, occupied_window, uncover
+
+MAGIC = b"SNAKETRACE1\n"
+VERSION = 2
+HEADER_SIZE = struct.Struct("<I")     # length of the JSON header after the magic
+BLOCK_HEADER = struct.Struct("<qqI")  # keyframe tick, keyframe generation, payload bytes (zlib compressed)
+RECORD_HEADER = struct.Struct("<qq")  # tick and flags of a tick record, tick and generation of a keyframe
+
+MOVES = [(1, 0), (-1, 0), (0, 1), (0, -1)] # direction codes of snake and food moves
+MOVE_CODES = {move: code for code, move in enumerate(MOVES)}
+DEATH = len(MOVES) # move code of a snake that crashed instead of moving
+NEW_GENERATION = 1 # tick record flag
+
+# events of one tick, in the order the simulation produces them - (name, dtype, values per event)
+TICK_SCHEMA = [
+    ("moves", "u1", 1),        # one move code per snake alive at the start of the tick, in slot order
+    ("shrinks", "<i4", 2),     # slot, segments dropped
+    ("starved", "<i4", 1),     # slot of a snake that died of energy or length
+    ("eats", "<i4", 2),        # slot, food id
+    ("food_moves", "<i4", 2),  # food id, move code
+    ("food_spawns", "<i4", 4), # food id, x, y, chromosome
+    ("snake_spawns", "<i4", 6),# x, y, dx, dy, chromosome, color - the snakes of a new generation
+]
+
+# everything drawable at a keyframe tick
+KEYFRAME_SCHEMA = [
+    ("chr", "<i4", 1), ("color", "u1", 1), ("score", "<i8", 1), ("energy", "<f8", 1),
+    ("just_ate", "u1", 1), ("length", "<i4", 1), ("cells", "<i4", 2),
+    ("food_id", "<i4", 1), ("food_position", "<i4", 2), ("food_chromosome", "<i4", 1),
+]
+
+# memoryview format and item size of every column dtype (traces are little-endian like the machines they run on)
+FORMATS = {
+    dtype: (np.dtype(dtype).char, np.dtype(dtype).itemsize)
+    for _, dtype, _ in TICK_SCHEMA + KEYFRAME_SCHEMA
+}
+
+
+def _encode(schema, head, columns):
+    """One record: the two header values, the length of every column, then the columns"""
+    arrays = [np.asarray(columns[name], dtype=dtype).reshape(-1, width) for name, dtype, width in schema]
+    counts = struct.pack(f"<{len(schema)}I", *(len(a) for a in arrays))
+    return RECORD_HEADER.pack(*head) + counts + b"".join(a.tobytes() for a in arrays)
+
+
+def _decode(schema, payload, offset):
+    """Inverse of _encode - (header values, {name: flat list of the column's values}, offset of the next record)"""
+    head = RECORD_HEADER.unpack_from(payload, offset)
+    offset += RECORD_HEADER.size
+    counts = struct.unpack_from(f"<{len(schema)}I", payload, offset)
+    offset += 4 * len(schema)
+    view = memoryview(payload)
+    columns = {}
+    for (name, dtype, width), count in zip(schema, counts):
+        char, itemsize = FORMATS[dtype]
+        end = offset + count * width * itemsize
+        columns[name] = view[offset:end].cast(char).tolist() # a plain cast is much cheaper than numpy here
+        offset = end
+    return head, columns, offset
+
+
+def _rows(values, width):
+    """Tuples of width values from a flat column list"""
+    it = iter(values)
+    return zip(*[it] * width)
+
+
+def _read_header(f, path):
+    """JSON header of a trace file, f positioned after it"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a trace file")
+    (size,) = HEADER_SIZE.unpack(f.read(HEADER_SIZE.size))
+    header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"{path} is a version {header['version']} trace, expected version {VERSION}")
+    return header
+
+
+class TraceRecorder:
+    """Writes a run's per-tick events to a trace file, in blocks that start with a keyframe of the drawable state.
+
+    A keyframe starts a new block every keyframe_every ticks and at every new generation. An existing trace
+    of the same world is continued (e.g. by a simulation resumed from a checkpoint).
+    """
+    def __init__(self, path, simulation, keyframe_every=100):
+        self.path = path
+        self.keyframe_every = keyframe_every
+        config = simulation.config
+        self.colors = {color: i for i, color in enumerate(config.SNAKE_COLORS.values())}
+        world = simulation.world
+        header = {
+            # the terrain is regenerated from its seed, chunked worlds only ever look up the tiles they need
+            "version": VERSION, "shape": list(world.terrain.shape), "terrain_seed": world.terrain_seed,
+            "chunked": not world.dense, "food_energy": config.FOOD_ENERGY, "keyframe_every": keyframe_every,
+            "colors": [list(color) for color in self.colors],
+        }
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                existing = _read_header(f, path)
+            if existing["shape"] != header["shape"] or existing["terrain_seed"] != header["terrain_seed"]:
+                raise ValueError(f"{path} holds the trace of a different world")
+        else:
+            encoded = json.dumps(header).encode()
+            with open(path, "wb") as f:
+                f.write(MAGIC + HEADER_SIZE.pack(len(encoded)) + encoded)
+        self.food_ids = {} # food -> id used in the events, ids are only meaningful within a block
+        self.next_food_id = 0
+        self.block = None  # (tick, generation, encoded keyframe) of the block being recorded
+        self.records = []  # encoded tick records of that block
+        self.closed = False
+        self.clear()
+        self.keyframe(simulation)
+        atexit.register(self.close) # flush the open block if the owner never closes us
+
+
+    def clear(self):
+        """Start collecting the events of a new tick"""
+        self.events = {name: [] for name, _, _ in TICK_SCHEMA}
+        self.flags = 0
+        self.lengths = []
+
+
+    def food_id(self, food):
+        if food not in self.food_ids:
+            self.food_ids[food] = self.next_food_id
+            self.next_food_id += 1
+        return self.food_ids[food]
+
+
+    def moved(self, snakes):
+        """After the moves: the move code of every snake, and its length before energy is spent"""
+        moves = self.events["moves"]
+        for snake in snakes:
+            if snake.alive:
+                head, neck = snake.body[0], snake.body[1]
+                moves.append(MOVE_CODES[(head[0] - neck[0], head[1] - neck[1])])
+            else:
+                moves.append(DEATH)
+            self.lengths.append(len(snake.body))
+
+
+    def spent_energy(self, snakes):
+        """After Population.spend_energy: which of the moved snakes shrank or died"""
+        for slot, (snake, move) in enumerate(zip(snakes, self.events["moves"])):
+            if move == DEATH:
+                continue
+            dropped = self.lengths[slot] - len(snake.body)
+            if dropped:
+                self.events["shrinks"].append((slot, dropped))
+            if not snake.alive:
+                self.events["starved"].append(slot)
+
+
+    def ate(self, slot, food):
+        self.events["eats"].append((slot, self.food_id(food)))
+        del self.food_ids[food]
+
+
+    def food_moved(self, food, old_position):
+        move = (food.position[0] - old_position[0], food.position[1] - old_position[1])
+        self.events["food_moves"].append((self.food_id(food), MOVE_CODES[move]))
+
+
+    def foods_spawned(self, foods):
+        for food in foods:
+            self.events["food_spawns"].append((self.food_id(food), *food.position, food.chromosome))
+
+
+    def new_generation(self, snakes):
+        self.flags |= NEW_GENERATION
+        self.events["snake_spawns"].extend(
+            (*snake.position, *snake.direction, snake.chr, self.colors[snake.color]) for snake in snakes
+        )
+
+
+    def end_tick(self, simulation):
+        """Store the tick's events, start a new block on keyframe ticks"""
+        self.records.append(_encode(TICK_SCHEMA, (simulation.tick_count, self.flags), self.events))
+        new_generation = self.flags & NEW_GENERATION
+        self.clear()
+        if new_generation or simulation.tick_count % self.keyframe_every == 0:
+            self.keyframe(simulation)
+
+
+    def keyframe(self, simulation):
+        """Write the open block and start the next one with the full drawable state"""
+        self.flush()
+        snakes = simulation.snakes
+        foods = list(simulation.foods)
+        columns = {
+            "chr": [s.chr for s in snakes], "color": [self.colors[s.color] for s in snakes],
+            "score": [s.score for s in snakes], "energy": [s.energy for s in snakes],
+            "just_ate": [s.just_ate for s in snakes], "length": [len(s.body) for s in snakes],
+            "cells": [pos for s in snakes for pos in s.body],
+            "food_id": [self.food_id(f) for f in foods], "food_position": [f.position for f in foods],
+            "food_chromosome": [f.chromosome for f in foods],
+        }
+        head = (simulation.tick_count, simulation.generation)
+        self.block = (simulation.tick_count, simulation.generation, _encode(KEYFRAME_SCHEMA, head, columns))
+
+
+    def flush(self):
+        if self.block is None:
+            return
+        tick, generation, keyframe = self.block
+        payload = zlib.compress(keyframe + b"".join(self.records), 6)
+        with open(self.path, "ab") as f:
+            f.write(BLOCK_HEADER.pack(tick, generation, len(payload)) + payload)
+        self.block = None
+        self.records = []
+
+
+    def close(self):
+        """Write the open block"""
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        atexit.unregister(self.close)
+
+
+class ReplaySnake:
+    """The drawable state of a snake, as rebuilt from a trace"""
+    def __init__(self, snake_id, body, chr, color, score=0, energy=None, just_ate=False):
+        self.id = snake_id
+        self.body = deque(body) # no per-tile counter - duplicated cells only ever sit at the tail, after eating
+        self.chr = chr
+        self.color = color
+        self.score = score
+        traits = genes.traits_of(chr)
+        self.max_energy = traits["max_energy"].item()
+        self.toxic_resistance = traits["toxic_resistance"].item()
+        self.energy = energy if energy is not None else float(self.max_energy) # newborn snakes are full
+        self.just_ate = just_ate
+        self.alive = True
+        self.path = [] # replays do no pathfinding
+
+
+    @property
+    def position(self):
+        return self.body[0]
+
+
+class ReplayWorld:
+    """Terrain and snake occupancy of a replayed run, enough for the Renderer and click picking"""
+    def __init__(self, terrain, chunked=False):
+        self.terrain = terrain
+        self.grid = terrain # indexes like a cost grid
+        self.rows, self.cols = terrain.shape
+        if chunked:
+            self.occupancy = ChunkGrid(terrain.shape, np.int32, EMPTY)
+        else:
+            self.occupancy = np.full(terrain.shape, EMPTY, dtype=np.int32)
+        self.stacked = {} # like World.stacked
+
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.rows and 0 <= pos[1] < self.cols
+
+
+    def reset_occupancy(self, snakes):
+        """Occupancy of a keyframe's or a new generation's snakes"""
+        if isinstance(self.occupancy, ChunkGrid):
+            self.occupancy.clear()
+        else:
+            self.occupancy.fill(EMPTY)
+        self.stacked = {}
+        for snake in snakes:
+            for pos in snake.body:
+                if self.in_bounds(pos): # a newborn's tail can stick out of the map
+                    cover(self.occupancy, self.stacked, pos, snake.id)
+
+
+    def vacate(self, pos, snake_id):
+        """Clear a tile the snake's tail left, see World.vacate"""
+        if self.in_bounds(pos):
+            uncover(self.occupancy, self.stacked, pos, snake_id)
+
+
+    def occupied_in(self, x0, x1, y0, y1):
+        """Snake tiles (n, 2) in rows x0:x1 and cols y0:y1 with their snake ids, see World.occupied_in"""
+        return occupied_window(self.occupancy, x0, x1, y0, y1)
+
+
+    def snake_at(self, pos, snakes):
+        """Return the snake covering a tile, if any"""
+        snake_id = self.occupancy[pos]
+        if snake_id == EMPTY:
+            return None
+        return next((s for s in snakes if s.id == snake_id), None)
+
+
+class TraceReplay:
+    """Plays a trace back tick by tick with no pathfinding or evolution - a stand-in for Simulation in the viewer"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header = _read_header(f, path)
+            self.blocks = [] # (tick, generation, payload offset, payload bytes), ticks ascending
+            while True:
+                data = f.read(BLOCK_HEADER.size)
+                if len(data) < BLOCK_HEADER.size:
+                    break
+                tick, generation, size = BLOCK_HEADER.unpack(data)
+                offset = f.tell()
+                if offset + size > os.fstat(f.fileno()).st_size: # block cut off by a crash - ignore it
+                    break
+                while self.blocks and self.blocks[-1][0] >= tick: # a resumed run rewrote these ticks
+                    self.blocks.pop()
+                self.blocks.append((tick, generation, offset, size))
+                f.seek(size, os.SEEK_CUR)
+        if not self.blocks:
+            raise ValueError(f"{path} holds no recorded ticks")
+        self.block_ticks = [block[0] for block in self.blocks]
+        height, width = self.header["shape"]
+        self.world = ReplayWorld(Terrain(height, width, self.header["terrain_seed"]), self.header["chunked"])
+        self.snake_ids = itertools.count() # replays number their snakes themselves, for the occupancy grid
+        # terrain costs as nested lists, cheap to index per move - chunked worlds look tiles up in the Terrain
+        self.costs = None if self.header["chunked"] else self.world.terrain.array().tolist()
+        self.colors = [tuple(color) for color in self.header["colors"]]
+        self.food_energy = self.header["food_energy"]
+        self.load_block(0)
+
+
+    @property
+    def first_tick(self):
+        return self.blocks[0][0]
+
+
+    def load_block(self, index):
+        """Jump to the keyframe that starts block index"""
+        _, _, offset, size = self.blocks[index]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            self.payload = zlib.decompress(f.read(size))
+        (self.tick_count, self.generation), kf, self.offset = _decode(KEYFRAME_SCHEMA, self.payload, 0)
+        self.block = index
+        self.running = True
+        cells = list(_rows(kf["cells"], 2))
+        ends = np.cumsum(kf["length"], dtype=np.int64).tolist()
+        self.snakes = [
+            ReplaySnake(next(self.snake_ids), cells[end - length:end], chr, self.colors[color], score, energy, bool(just_ate))
+            for end, length, chr, color, score, energy, just_ate in zip(
+                ends, kf["length"], kf["chr"], kf["color"], kf["score"], kf["energy"], kf["just_ate"]
+            )
+        ]
+        self.world.reset_occupancy(self.snakes)
+        self.foods = FoodIndex()
+        self.food_ids = {}
+        for food_id, position, chromosome in zip(kf["food_id"], _rows(kf["food_position"], 2), kf["food_chromosome"]):
+            self.spawn_food(food_id, position, chromosome)
+
+
+    def spawn_food(self, food_id, position, chromosome):
+        food = Food(position, chromosome=chromosome)
+        self.food_ids[food_id] = food
+        self.foods.add(food)
+
+
+    def update(self):
+        """Apply the next tick of the trace, stop running at its end"""
+        if self.block + 1 < len(self.blocks) and self.tick_count >= self.block_ticks[self.block + 1]:
+            self.load_block(self.block + 1)
+        if self.offset >= len(self.payload):
+            if self.block + 1 == len(self.blocks):
+                self.running = False
+                return
+            self.load_block(self.block + 1)
+        (self.tick_count, flags), events, self.offset = _decode(TICK_SCHEMA, self.payload, self.offset)
+        costs = self.costs
+        world = self.world
+        terrain, occupancy, vacate = world.terrain, world.occupancy, world.vacate
+
+        snakes = self.snakes
+        for snake, move in zip(snakes, events["moves"]):
+            if move == DEATH:
+                snake.alive = False # the body is cleared at the end of the tick, like in the simulation
+                continue
+            dx, dy = MOVES[move]
+            body = snake.body
+            x, y = body[0]
+            x, y = x + dx, y + dy
+            if snake.just_ate:
+                snake.just_ate = False
+            else:
+                tail = body.pop()
+                if body[-1] != tail:
+                    vacate(tail, snake.id)
+            body.appendleft((x, y))
+            occupancy[x, y] = snake.id
+            snake.energy -= max(1, costs[x][y] if costs is not None else terrain[x, y])
+        for slot, count in _rows(events["shrinks"], 2):
+            snake = snakes[slot]
+            body = snake.body
+            for _ in range(count):
+                tail = body.pop()
+                if body[-1] != tail:
+                    world.vacate(tail, snake.id)
+        for slot in events["starved"]:
+            snakes[slot].alive = False
+        for slot, food_id in _rows(events["eats"], 2): # same arithmetic as Simulation.update
+            snake = snakes[slot]
+            food = self.food_ids.pop(food_id)
+            self.foods.remove(food)
+            if food.toxic == False:
+                snake.score += 1
+                snake.body.append(snake.body[-1])
+                snake.just_ate = True
+                snake.energy = float(min(snake.energy + self.food_energy, snake.max_energy))
+            else:
+                snake.energy -= food.energy_factor * self.food_energy * snake.toxic_resistance
+                snake.score += 3
+        for food_id, move in _rows(events["food_moves"], 2):
+            food = self.food_ids[food_id]
+            old_position = food.position
+            dx, dy = MOVES[move]
+            food.position = (old_position[0] + dx, old_position[1] + dy)
+            self.foods.relocate(food, old_position)
+        for snake in snakes:
+            if not snake.alive: # World.remove_snake
+                for pos in snake.body:
+                    vacate(pos, snake.id)
+        self.snakes = [snake for snake in snakes if snake.alive]
+
+        for food_id, x, y, chromosome in _rows(events["food_spawns"], 4):
+            self.spawn_food(food_id, (x, y), chromosome)
+        if flags & NEW_GENERATION:
+            self.generation += 1
+            self.snakes = [
+                ReplaySnake(next(self.snake_ids), [(x, y), (x - dx, y - dy), (x - 2*dx, y - 2*dy)], chr, self.colors[color])
+                for x, y, dx, dy, chr, color in _rows(events["snake_spawns"], 6)
+            ]
+            world.reset_occupancy(self.snakes)
+
+
+    def step(self, n=1):
+        """Advance by up to n ticks, return the number of ticks replayed"""
+        done = 0
+        while done < n and self.running:
+            self.update()
+            if self.running:
+                done += 1
+        return done
+
+
+    def seek(self, tick):
+        """Jump to any recorded tick: restore the closest keyframe before it, then replay the rest"""
+        tick = max(tick, self.first_tick)
+        self.load_block(max(bisect.bisect_right(self.block_ticks, tick) - 1, 0))
+        while self.running and self.tick_count < tick:
+            self.update()
+
+
+    def seek_generation(self, generation):
+        """Jump to the first tick of a generation (keyframes are written at every generation start)"""
+        for tick, block_generation, _, _ in self.blocks:
+            if block_generation >= generation:
+                return self.seek(tick)
+        self.seek(self.blocks[-1][0])
+
+
+    def close(self):
+        pass
@@ -1,9 +1,10 @@
 import numpy as np
 import random
-import core.config as config
+import core.config as default_config
 from vnoise import Noise
 from entities.food import Food
-from core.genes import mutate
+import core.genes as genes
+from core.spatial import CHUNK_SIZE, EMPTY, ChunkGrid, FoodIndex, TileSet, grid_window
 
 # configurable vars
 OFFSET_X = random.random() * 100
@@ -13,67 +14,459 @@ OCTAVES = 3
 PERSISTENCE = 0.5
 LACUNARITY = 1.25
 
+TERRAIN_THRESHOLDS = [-0.4, -0.25, 0] # noise value boundaries between terrain classes
+TERRAIN_COSTS = [999, 7, 3, 1]           # impassable peaks, mountains, hills, grass
+FOOD_BIT_MASKS = 1 << np.arange(5)       # food chromosomes cross over bit by bit
+START_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)] # directions tried for initial snake spawns
+SPAWN_ATTEMPTS = 100 # random draws per wanted tile before a chunked world gives up looking for free ones
+
+# terrain tiles are uint8: the index of their class in TERRAIN_COSTS, plus this bit if they are passable
+PASSABLE = 0x80
+TILE_COSTS = np.array([
+    TERRAIN_COSTS[tile & ~PASSABLE] if tile & ~PASSABLE < len(TERRAIN_COSTS) else 999 for tile in range(256)
+]) # cost of every tile value
+TILE_COST_LIST = TILE_COSTS.tolist()
+
+
+def classify_terrain(noise_values):
+    """Map an array of noise values to terrain costs"""
+    conditions = [noise_values < t for t in TERRAIN_THRESHOLDS]
+    return np.select(conditions, TERRAIN_COSTS[:-1], default=TERRAIN_COSTS[-1]).astype(int)
+
+
+def perlin_noise(noise, x0, y0, height, width):
+    """Noise values of the height x width tiles from (x0, y0) - a pure function of the tile, so chunks fit together"""
+    rows = np.arange(x0, x0 + height) / SCALING_FACTOR  # x = row
+    cols = np.arange(y0, y0 + width) / SCALING_FACTOR   # y = col
+    # grid_mode evaluates the noise for every (row, col) pair in one batched call
+    return noise.noise2(rows, cols, octaves=OCTAVES, persistence=PERSISTENCE, lacunarity=LACUNARITY, grid_mode=True)
+
+
+def perlin_terrain(height, width, seed):
+    """Terrain cost grid (height rows, width cols) from seeded Perlin noise"""
+    return classify_terrain(perlin_noise(Noise(seed=seed), 0, 0, height, width))
+
+
+class Terrain(ChunkGrid):
+    """Perlin terrain of a world, generated chunk by chunk on first access.
+
+    Stores uint8 tiles (cost class plus PASSABLE bit); indexing it like a cost grid - with a tile, arrays of
+    rows and cols or a window of slices - gives terrain costs, the same values perlin_terrain would.
+    """
+    def __init__(self, height, width, seed, chunk_size=CHUNK_SIZE):
+        super().__init__((height, width), np.uint8, 0, chunk_size) # outside the map: class 0, impassable
+        self.seed = seed
+        self.noise = Noise(seed=seed)
+
+
+    def load(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            cx, cy = key
+            s = self.chunk_size
+            if not (0 <= cx * s < self.shape[0] and 0 <= cy * s < self.shape[1]):
+                return None
+            classes = np.digitize(perlin_noise(self.noise, cx * s, cy * s, s, s), TERRAIN_THRESHOLDS)
+            chunk = classes.astype(np.uint8)
+            chunk[TILE_COSTS[chunk] != 999] |= PASSABLE
+            self.chunks[key] = chunk
+        return chunk
+
+
+    def __getitem__(self, key):
+        x, y = key
+        if isinstance(x, slice): # window, clipped to the map like a numpy slice
+            x0, x1, _ = x.indices(self.shape[0])
+            y0, y1, _ = y.indices(self.shape[1])
+            return self.costs(x0, x1, y0, y1)
+        if isinstance(x, np.ndarray):
+            return TILE_COSTS[self.gather(x, y)]
+        return TILE_COST_LIST[super().__getitem__(key)]
+
+
+    def costs(self, x0, x1, y0, y1):
+        """Cost grid of rows x0:x1 and cols y0:y1, impassable (999) outside the map"""
+        return TILE_COSTS[self.window(x0, x1, y0, y1)]
+
+
+    def array(self):
+        """Cost grid of the whole map - generates every chunk"""
+        return self.costs(0, self.shape[0], 0, self.shape[1])
+
+
+def box_count(mask, radius, out=None):
+    """Number of set cells in the (2r+1)x(2r+1) square around every cell (integral image), written into out if given"""
+    if radius == 0:
+        if out is None:
+            return mask.copy()
+        out[:] = mask
+        return out
+    size = 2 * radius + 1
+    sums = np.pad(np.pad(mask, radius).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    out = np.subtract(sums[size:, size:], sums[:-size, size:], out=out)
+    out -= sums[size:, :-size]
+    out += sums[:-size, :-size]
+    return out
+
+
+def occupied_window(occupancy, x0, x1, y0, y1):
+    """(tiles as an (n, 2) array, snake ids) of every snake tile in rows x0:x1 and cols y0:y1 of an occupancy grid"""
+    window = grid_window(occupancy, x0, x1, y0, y1, EMPTY)
+    tiles = np.argwhere(window != EMPTY)
+    return tiles + (x0, y0), window[tiles[:, 0], tiles[:, 1]]
+
+
+def cover(occupancy, stacked, pos, snake_id):
+    """Put a snake on a tile - a different snake already on it (snakes can spawn overlapping) is kept in stacked"""
+    owner = occupancy[pos]
+    if owner != EMPTY and owner != snake_id:
+        stacked.setdefault(pos, []).append(int(owner))
+    occupancy[pos] = snake_id
+
+
+def uncover(occupancy, stacked, pos, snake_id):
+    """Take a snake off a tile, which goes back to a snake stacked under it - True if the tile is empty now"""
+    others = stacked.get(pos)
+    if others is None:
+        if occupancy[pos] != snake_id:
+            return False
+        occupancy[pos] = EMPTY
+        return True
+    if occupancy[pos] == snake_id:
+        occupancy[pos] = others.pop()
+    elif snake_id in others:
+        others.remove(snake_id)
+    if not others:
+        del stacked[pos]
+    return False
+
+
+class Halo:
+    """Lazy view of the tiles within a snake's timidity of other snakes, read from the shared per-tick counts.
+
+    counts covers the whole map, or with an origin only the window starting there (chunked worlds) - tiles
+    outside the window are then counted from the occupancy on demand.
+    """
+    def __init__(self, counts, occupancy, snake_id, body, position, vision_range, timidity, origin=None):
+        # plain arrays and values only, so decision pool workers can build one from shared memory
+        self.counts = counts
+        self.occupancy = occupancy
+        self.origin = origin if origin is not None else (0, 0)
+        self.windowed = origin is not None
+        self.timidity = timidity
+        self.position = position
+        self.vision_range = vision_range
+        rows, cols = occupancy.shape
+        self.own = [
+            p for p in set(body) if 0 <= p[0] < rows and 0 <= p[1] < cols and occupancy[p] == snake_id
+        ]
+        self._tiles = None
+
+
+    def __contains__(self, pos):
+        """O(1) for tiles away from snakes - own body is only subtracted where the shared count is set"""
+        x, y = pos
+        t = self.timidity
+        ox, oy = self.origin
+        if 0 <= x - ox < self.counts.shape[0] and 0 <= y - oy < self.counts.shape[1]:
+            count = self.counts[x - ox, y - oy]
+        elif self.windowed:
+            count = int((self.occupancy.window(x - t, x + t + 1, y - t, y + t + 1) != EMPTY).sum())
+        else:
+            return False
+        if count == 0:
+            return False
+        own = sum(1 for bx, by in self.own if abs(bx - x) <= t and abs(by - y) <= t)
+        return count > own
+
+
+    def tiles(self):
+        """All halo tiles within the snake's vision, as a set of positions"""
+        if self._tiles is None:
+            t = self.timidity
+            ox, oy = self.origin
+            x, y = self.position[0] - ox, self.position[1] - oy # in window coordinates
+            radius = self.vision_range
+            rows, cols = self.counts.shape
+            x0, x1 = max(0, x - radius), min(rows, x + radius + 1)
+            y0, y1 = max(0, y - radius), min(cols, y + radius + 1)
+            counts = self.counts[x0:x1, y0:y1]
+
+            # subtract the snake's own contribution, counted over the window grown by t
+            own = np.zeros((x1 - x0 + 2 * t, y1 - y0 + 2 * t), dtype=np.int32)
+            for bx, by in self.own:
+                bx, by = bx - ox, by - oy
+                if x0 - t <= bx < x1 + t and y0 - t <= by < y1 + t:
+                    own[bx - x0 + t, by - y0 + t] = 1
+            if t:
+                counts = counts - box_count(own, t)[t:-t, t:-t]
+            else:
+                counts = counts - own
+
+            xs, ys = np.nonzero(counts > 0)
+            xs += x0
+            ys += y0
+            near = np.abs(xs - x) + np.abs(ys - y) <= radius
+            self._tiles = set(zip((xs[near] + ox).tolist(), (ys[near] + oy).tolist()))
+        return self._tiles
+
+
+class SampledTiles:
+    """Free tiles of a chunked world: found by rejection sampling when needed instead of being indexed"""
+    def __init__(self, world):
+        self.world = world
+
+
+    def add(self, tile):
+        pass
+
+
+    def discard(self, tile):
+        pass
+
+
+    def sample(self, k, rng):
+        """Up to k distinct random passable tiles with neither a snake nor a food on them"""
+        world = self.world
+        found = {}
+        for _ in range(SPAWN_ATTEMPTS):
+            if len(found) >= k:
+                break
+            n = 2 * (k - len(found))
+            xs, ys = rng.integers(0, world.height, n), rng.integers(0, world.width, n)
+            passable = (world.terrain.gather(xs, ys) & PASSABLE).tolist()
+            for x, y, ok in zip(xs.tolist(), ys.tolist(), passable):
+                if ok and world.occupancy[x, y] == EMPTY and world.foods.first_at((x, y)) is None:
+                    found[(x, y)] = None
+                    if len(found) == k:
+                        break
+        return list(found)
+
+
 class World:
-    """Controls terrain math and food spawn logic"""
-    def __init__(self):
-        self.width = config.WINDOW_WIDTH// config.TILE_SIZE
-        self.height = config.WINDOW_HEIGHT // config.TILE_SIZE
-        self.grid = self.generate_perlin_terrain()
-        self.foods = []
+    """Controls terrain math and food spawn logic.
+
+    The terrain is generated chunk by chunk as it is first needed. Worlds of up to config.CHUNKED_WORLD_TILES
+    tiles then keep flat per-tile arrays (cost grid, occupancy, free tiles); larger ones keep the occupancy
+    per chunk too and sample spawn tiles at random, so memory follows the area actually visited.
+    """
+    def __init__(self, config=None, rng=None, terrain_seed=None):
+        config = config if config is not None else default_config
+        # numpy generator for batched sampling, derived from the random module's state so one seed fixes both
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+        self.width = config.WORLD_WIDTH
+        self.height = config.WORLD_HEIGHT
+        if terrain_seed is None:
+            self.terrain = self.generate_perlin_terrain()
+        else: # terrain of a checkpoint
+            self.terrain_seed = terrain_seed
+            self.terrain = Terrain(self.height, self.width, terrain_seed)
+        self.dense = self.height * self.width <= config.CHUNKED_WORLD_TILES
+        self.halos = {} # timidity -> per-tile count of nearby snake tiles, rebuilt every tick (dense worlds)
+        self.halo_buffers = {} # timidity -> array its halo counts are written into, e.g. a DecisionPool's shared memory
+        self.foods = FoodIndex() # spatially indexed foods currently on the map
+        self.stacked = {} # tile -> ids of the other snakes on a tile, under the one in occupancy (see cover)
+        if self.dense:
+            self.grid = self.terrain.array() # terrain cost per tile
+            self.passable = np.argwhere(self.grid != 999) # (n, 2) array of passable tiles, terrain is static
+            self.occupancy = np.full(self.grid.shape, EMPTY, dtype=np.int32) # snake id per tile, EMPTY if free
+            # passable tiles with neither a snake nor a food on them, kept in sync by the methods below
+            self.free = TileSet.from_mask(self.grid != 999)
+        else:
+            self.grid = self.terrain # indexes like a cost grid
+            self.occupancy = ChunkGrid(self.terrain.shape, np.int32, EMPTY)
+            self.free = SampledTiles(self)
         
         
     def generate_perlin_terrain(self):
-        """Generate world map using Perlin noise"""
-        noise = Noise(seed=random.randint(0, 1000))
-        grid = np.zeros((self.height, self.width), dtype=int)
-        for x in range(self.height):      # x = row
-            for y in range(self.width):   # y = col
-                n = noise.noise2(x/SCALING_FACTOR, y/SCALING_FACTOR, octaves=OCTAVES, persistence=PERSISTENCE, lacunarity=LACUNARITY)  
-                if n < -0.4:
-                    grid[x][y] = 999  # Impassable
-                elif n < -0.25:
-                    grid[x][y] = 7    # Mountains (high cost)
-                elif n < 0:
-                    grid[x][y] = 3    # Hills (medium cost)
-                else:
-                    grid[x][y] = 1    # Grass (low cost)
-        return grid
+        """Generate world map using Perlin noise - chunks are only computed once something reads them"""
+        self.terrain_seed = random.randint(0, 1000)
+        return Terrain(self.height, self.width, self.terrain_seed)
 
-        
-        
-    def spawn_food(self, count, snakes=None, parent_foods=None):
+
+
+    def in_bounds(self, pos):
+        """Check if a position (x, y) is inside the map"""
+        return 0 <= pos[0] < self.grid.shape[0] and 0 <= pos[1] < self.grid.shape[1]
+
+
+    def sample_snake_starts(self, count):
+        """Up to count distinct random (head, direction) spawns whose 3 segments are passable"""
+        if self.dense:
+            starts = self.snake_starts()
+            return random.sample(starts, min(count, len(starts)))
+        chosen = {}
+        for _ in range(count * SPAWN_ATTEMPTS):
+            if len(chosen) == count:
+                break
+            x, y = random.randrange(self.height), random.randrange(self.width)
+            dx, dy = random.choice(START_DIRECTIONS)
+            cells = [(x - i * dx, y - i * dy) for i in range(3)]
+            if all(self.in_bounds(cell) and self.grid[cell] != 999 for cell in cells):
+                chosen[((x, y), (dx, dy))] = None
+        return list(chosen)
+
+
+    def random_passable(self, count, rng):
+        """count random passable tiles (repeats allowed) as a (count, 2) array, fewer if none can be found"""
+        if self.dense:
+            return self.passable[rng.integers(0, len(self.passable), count)]
+        found, total = [], 0
+        for _ in range(SPAWN_ATTEMPTS):
+            if total >= count:
+                break
+            xs, ys = rng.integers(0, self.height, 2 * count), rng.integers(0, self.width, 2 * count)
+            ok = (self.terrain.gather(xs, ys) & PASSABLE) > 0
+            found.append(np.column_stack([xs[ok], ys[ok]]))
+            total += int(ok.sum())
+        return np.concatenate(found)[:count] if found else np.empty((0, 2), dtype=np.int64)
+
+
+    def snake_starts(self):
+        """Every (head, direction) whose 3 segments head, head - d, head - 2d are passable, head tiles in row-major order"""
+        passable = self.grid != 999
+        rows, cols = passable.shape
+        starts = np.zeros((rows, cols, len(START_DIRECTIONS)), dtype=bool)
+        for d, (dx, dy) in enumerate(START_DIRECTIONS):
+            ok = passable.copy()
+            for i in (1, 2): # segment i sits at (x - i*dx, y - i*dy) - shift the passable mask onto the head tile
+                shifted = np.zeros_like(passable)
+                shifted[max(i*dx, 0):rows + min(i*dx, 0), max(i*dy, 0):cols + min(i*dy, 0)] = \
+                    passable[max(-i*dx, 0):rows + min(-i*dx, 0), max(-i*dy, 0):cols + min(-i*dy, 0)]
+                ok &= shifted
+            starts[:, :, d] = ok
+        return [((x, y), START_DIRECTIONS[d]) for x, y, d in np.argwhere(starts).tolist()]
+
+
+    def occupy(self, pos, snake_id):
+        """Mark a tile as taken by a snake"""
+        cover(self.occupancy, self.stacked, pos, snake_id)
+        self.free.discard(pos)
+
+
+    def vacate(self, pos, snake_id):
+        """Clear a snake's tile, it becomes free unless a food or another snake lies on it"""
+        if not self.in_bounds(pos) or not uncover(self.occupancy, self.stacked, pos, snake_id):
+            return
+        if self.grid[pos] != 999 and self.foods.first_at(pos) is None:
+            self.free.add(pos)
+
+
+    def remove_snake(self, snake):
+        """Clear a (dead) snake's body from the occupancy grid"""
+        for pos in snake.body.cells():
+            self.vacate(pos, snake.id)
+
+
+    def reset_occupancy(self, snakes):
+        """Rebuild the occupancy grid and the free tiles from scratch, e.g. for a new generation"""
+        if self.dense:
+            self.occupancy.fill(EMPTY)
+        else:
+            self.occupancy.clear()
+        self.stacked = {}
+        for snake in snakes or []:
+            for pos in snake.body.cells():
+                if self.in_bounds(pos):
+                    cover(self.occupancy, self.stacked, pos, snake.id)
+        if not self.dense: # free tiles are sampled, nothing to rebuild
+            return
+        free = (self.grid != 999) & (self.occupancy == EMPTY)
+        for x, y in self.foods.cells:
+            free[x, y] = False
+        self.free = TileSet.from_mask(free)
+
+
+    def add_foods(self, foods):
+        """Put new foods on the map"""
+        for food in foods:
+            self.foods.add(food)
+            self.free.discard(food.position)
+
+
+    def remove_food(self, food):
+        """Take a food (e.g. eaten) off the map"""
+        self.foods.remove(food)
+        self.release_food_tile(food.position)
+
+
+    def relocate_food(self, food, old_position):
+        """Update the food index and free tiles after food.position changed from old_position"""
+        self.foods.relocate(food, old_position)
+        self.free.discard(food.position)
+        self.release_food_tile(old_position)
+
+
+    def release_food_tile(self, pos):
+        """A tile a food left is free again if no snake and no other food is on it"""
+        if self.occupancy[pos] == EMPTY and self.foods.first_at(pos) is None:
+            self.free.add(pos)
+
+
+    def update_halos(self, timidities):
+        """Once per tick: for each timidity t, count snake tiles in the (2t+1)x(2t+1) square around every tile"""
+        if not self.dense: # chunked worlds count per snake, around what it can see
+            return
+        occupied = (self.occupancy != EMPTY).astype(np.int32)
+        self.halos = {t: box_count(occupied, t, self.halo_buffers.get(t)) for t in set(timidities)}
+
+
+    def halo_obstacles(self, snake):
+        """Tiles a snake avoids this tick: within its timidity of another snake's body"""
+        if not self.dense:
+            t, r = snake.timidity, snake.vision_range
+            x, y = snake.position
+            occupied = (self.occupancy.window(x - r - t, x + r + t + 1, y - r - t, y + r + t + 1) != EMPTY)
+            counts = box_count(occupied.astype(np.int32), t)
+            counts = counts[t:counts.shape[0] - t, t:counts.shape[1] - t] # tiles whose whole square is in the window
+            return Halo(
+                counts, self.occupancy, snake.id, snake.body.cells(),
+                snake.position, r, t, origin=(x - r, y - r)
+            )
+        if snake.timidity not in self.halos:
+            self.update_halos(list(self.halos) + [snake.timidity])
+        return Halo(
+            self.halos[snake.timidity], self.occupancy, snake.id, snake.body.cells(),
+            snake.position, snake.vision_range, snake.timidity
+        )
+
+
+    def occupied(self):
+        """(tiles as an (n, 2) array, snake ids) of every tile a snake is on"""
+        if not self.dense:
+            return self.occupancy.items()
+        tiles = np.argwhere(self.occupancy != EMPTY)
+        return tiles, self.occupancy[tiles[:, 0], tiles[:, 1]]
+
+
+    def occupied_in(self, x0, x1, y0, y1):
+        """Like occupied, for one rectangle only - what the viewer's camera sees"""
+        return occupied_window(self.occupancy, x0, x1, y0, y1)
+
+
+    def snake_at(self, pos, snakes):
+        """Return the snake occupying a tile, if any"""
+        snake_id = self.occupancy[pos]
+        if snake_id == EMPTY:
+            return None
+        return next((s for s in snakes if s.id == snake_id), None)
+
+
+    def spawn_food(self, count, parent_foods=None):
         """Spawn config.FOOD_NR food entities"""
-        occupied = set()
-        if snakes:
-            for snake in snakes:
-                occupied.update(snake.body)
-        valid_positions = [
-            (x, y)
-            for x in range(self.grid.shape[0])
-            for y in range(self.grid.shape[1])
-            if self.grid[x][y] != 999 and (x, y) not in occupied
-        ]
+        positions = self.free.sample(count, self.rng) # distinct tiles without snakes or foods, O(count)
+        count = len(positions)
+        if count == 0:
+            return []
         # Use survivor foods as parents
-        new_foods = []
-        for _ in range(min(count, len(valid_positions))):
-            pos = random.choice(valid_positions)
-            if parent_foods and len(parent_foods) > 1:
-                parent1 = random.choice(parent_foods)
-                parent2 = random.choice(parent_foods)
-                while parent2 == parent1:
-                    parent2 = random.choice(parent_foods)
-
-                chr = 0
-                for i in range(5): 
-                    bit_mask = 1 << i
-                    if random.random() < 0.5:
-                        chr |= (parent1.chromosome & bit_mask)
-                    else:
-                        chr |= (parent2.chromosome & bit_mask)
-
-                # Mutation
-                chr = mutate(chr, 0.15, 5) # 15% mutation chance
-                new_foods.append(Food(pos, chromosome=chr))
-            else:
-                new_foods.append(Food(pos))
-        return new_foods
\ No newline at end of file
+        if parent_foods and len(parent_foods) > 1:
+            parents = np.array([f.chromosome for f in parent_foods], dtype=np.int64)
+            parents1, parents2 = genes.pick_parents(count, len(parents), self.rng)
+            # every bit from either parent with equal chance, then 15% mutation chance
+            chromosomes = genes.crossover_batch(
+                parents[parents1], parents[parents2], self.rng, masks=FOOD_BIT_MASKS, bias=0.5
+            )
+            chromosomes = genes.mutate_batch(chromosomes, 0.15, self.rng, 5).tolist()
+        else:
+            chromosomes = self.rng.integers(0, 1 << 5, count).tolist()
+        return [Food(pos, chromosome=chr) for pos, chr in zip(positions, chromosomes)]
@@ -0,0 +1,31 @@
+import argparse
+import ast
+from simulation.batch import expand_grid, run_batch, write_summary
+
+
+def parse_override(text):
+    """NAME=v1,v2,... -> (NAME, [v1, v2, ...])"""
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=value[,value...], got {text!r}")
+    return name.strip(), [ast.literal_eval(v.strip()) for v in values.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of config overrides headless on a process pool")
+    parser.add_argument("--set", dest="overrides", type=parse_override, action="append", default=[],
+                        metavar="NAME=V1,V2", help="core.config variable and the values to try (repeatable)")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="seeds to run every combination with")
+    parser.add_argument("--generations", type=int, default=5, help="generations per run")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="sweep_summary.csv", help="merged per-generation results")
+    args = parser.parse_args()
+
+    override_sets = expand_grid(dict(args.overrides))
+    print(f"Running {len(override_sets) * len(args.seeds)} simulations for {args.generations} generations each")
+    rows = run_batch(override_sets, args.seeds, args.generations, args.workers)
+    write_summary(rows, args.out)
+    print(f"Wrote {len(rows)} rows to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+from core.config import Config
+from simulation.engine import Simulation
+
+
+def test_profiler_times_the_tick_the_population_died_out():
+    config = Config(WORLD_WIDTH=30, WORLD_HEIGHT=30, SNAKE_COUNT=4, PROFILE=True, PROFILE_FILE="")
+    simulation = Simulation(seed=0, config=config, log_files=False)
+    try:
+        simulation.update()
+        for snake in simulation.snakes:
+            snake.alive = False
+        simulation.update() # everyone is culled, the run ends here
+        assert not simulation.running
+        assert simulation.profiler.phases["tick"].count == 2
+    finally:
+        simulation.close()
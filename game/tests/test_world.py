@@ -0,0 +1,73 @@
+import random
+import numpy as np
+from core.config import Config
+from entities.body import Body
+from simulation.world import EMPTY, World, box_count
+
+
+class StubSnake:
+    """Just what the occupancy bookkeeping reads from a snake"""
+    def __init__(self, snake_id, cells):
+        self.id = snake_id
+        self.body = Body(cells)
+
+
+def overlapping_snakes(**config):
+    """A world with two snakes sharing their middle tile, as spawns at a generation start can"""
+    random.seed(0)
+    world = World(Config(WORLD_WIDTH=30, WORLD_HEIGHT=30, **config))
+    # five passable tiles in a row
+    x, y = next(
+        (x, y) for x in range(30) for y in range(26)
+        if all(world.grid[x, y + i] != 999 for i in range(5))
+    )
+    a = StubSnake(1, [(x, y), (x, y + 1), (x, y + 2)])
+    b = StubSnake(2, [(x, y + 2), (x, y + 3), (x, y + 4)])
+    world.reset_occupancy([a, b])
+    return world, a, b, (x, y + 2)
+
+
+def test_shared_tile_stays_taken_until_both_snakes_left():
+    world, a, b, shared = overlapping_snakes()
+    assert world.occupancy[shared] == b.id
+    world.vacate(shared, b.id) # the snake on top leaves first
+    assert world.occupancy[shared] == a.id
+    assert shared not in world.free
+    world.vacate(shared, a.id)
+    assert world.occupancy[shared] == EMPTY
+    assert shared in world.free
+
+
+def test_snake_under_another_leaving_keeps_the_tile_taken():
+    world, a, b, shared = overlapping_snakes()
+    world.vacate(shared, a.id)
+    assert world.occupancy[shared] == b.id
+    assert shared not in world.free
+    world.vacate(shared, b.id)
+    assert world.occupancy[shared] == EMPTY
+    assert shared in world.free
+
+
+def test_removing_a_dead_snake_keeps_the_other_ones_body():
+    world, a, b, shared = overlapping_snakes()
+    world.remove_snake(b)
+    tiles, ids = world.occupied()
+    assert {tuple(t) for t in tiles.tolist()} == set(a.body.cells())
+    assert set(ids.tolist()) == {a.id}
+    assert not world.stacked
+
+
+def test_chunked_world_keeps_the_shared_tile_too():
+    world, a, b, shared = overlapping_snakes(CHUNKED_WORLD_TILES=0)
+    world.vacate(shared, b.id)
+    assert world.occupancy[shared] == a.id
+    world.vacate(shared, a.id)
+    assert world.occupancy[shared] == EMPTY
+
+
+def test_box_count_into_a_buffer_matches_a_fresh_count():
+    mask = (np.random.default_rng(0).random((20, 30)) < 0.3).astype(np.int32)
+    for radius in (0, 1, 3):
+        out = np.full(mask.shape, -5, dtype=np.int64)
+        assert box_count(mask, radius, out) is out
+        assert (out == box_count(mask, radius)).all()